@@ -10,3 +10,10 @@ def init_logger(debug=False):
     if debug is True:
         logger.setLevel(logging.DEBUG)
         logging.getLogger(BOTO_LOGGER_NAME).setLevel(logging.DEBUG)
+
+
+class ClusterLoggerAdapter(logging.LoggerAdapter):
+    """prefixes records with the cluster name, so logs of clusters handled concurrently can be told apart"""
+
+    def process(self, msg, kwargs):
+        return '[%s] %s' % (self.extra['cluster'], msg), kwargs
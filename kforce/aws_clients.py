@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+# enough connections for every worker of a fleet run sharing the same client
+MAX_POOL_CONNECTIONS = 32
+# `adaptive` rate limits client side once AWS starts throttling
+RETRIES = dict(mode='adaptive', max_attempts=10)
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+
+
+def _key(profile, region):
+    return (profile or os.environ.get('AWS_PROFILE'), region or os.environ.get('AWS_DEFAULT_REGION'))
+
+
+def get_session(profile=None, region=None):
+    """one `boto3` session per profile/region in this process"""
+    key = _key(profile, region)
+    with _lock:
+        if key not in _sessions:
+            import boto3
+
+            logger.debug('creating boto3 session -> profile: %s, region: %s', *key)
+            _sessions[key] = boto3.session.Session(profile_name=key[0], region_name=key[1])
+        return _sessions[key]
+
+
+def get_client(service, region=None, profile=None):
+    """
+    shared client of `service` for profile/region, clients are thread safe so callers in different threads
+    (e.g. fleet workers) share the same one and its connection pool.
+    """
+    key = (service, ) + _key(profile, region)
+    if key in _clients:
+        return _clients[key]
+
+    from botocore.config import Config
+
+    session = get_session(profile=profile, region=region)
+    with _lock:
+        if key not in _clients:
+            logger.debug('creating boto3 client -> %s', key)
+            client = session.client(
+                service, config=Config(max_pool_connections=MAX_POOL_CONNECTIONS, retries=dict(RETRIES))
+            )
+            tracing.instrument_client(client)
+            _clients[key] = client
+        return _clients[key]
+
+
+def reset():
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
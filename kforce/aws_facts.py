@@ -1,29 +1,28 @@
-import boto3  # pragma: no cover
+from .aws_clients import get_client
 
 SUBNET_GROUPS = (
     'public',
     'private',
-)  # pragma: no cover
+)
 
 
-def check_rt_internet_facing(facing, route_table):  # pragma: no cover
+def check_rt_internet_facing(facing, route_table):
     assert facing in SUBNET_GROUPS, 'facing has to be in %s' % SUBNET_GROUPS
+    routes = route_table.get('Routes', [])
     routes_facing_igw = [
-        route for route in route_table.routes
-        if route.state == 'active'
-        and route.gateway_id is not None
-        and route.gateway_id.startswith('igw-')
+        route for route in routes
+        if route.get('State') == 'active'
+        and (route.get('GatewayId') or '').startswith('igw-')
     ]  # yapf: disable
     routes_facing_nat = [
-        route for route in route_table.routes
-        if route.state == 'active'
-        and route.nat_gateway_id is not None
-        and route.nat_gateway_id.startswith('nat-')
+        route for route in routes
+        if route.get('State') == 'active'
+        and (route.get('NatGatewayId') or '').startswith('nat-')
     ]  # yapf: disable
     nat_id = None
     try:
-        nat_id = routes_facing_nat[0].nat_gateway_id
-    except (AttributeError, IndexError):
+        nat_id = routes_facing_nat[0]['NatGatewayId']
+    except (KeyError, IndexError):
         ...
     if facing == 'public':
         return len(routes_facing_igw) > 0, nat_id
@@ -31,34 +30,86 @@ def check_rt_internet_facing(facing, route_table):  # pragma: no cover
         return len(routes_facing_igw) == 0 and len(routes_facing_nat) > 0, nat_id  # yapf: disable
 
 
-def get_vpc_facts(vpc_id):  # pragma: no cover
-    ec2_c = boto3.resource('ec2')
-    vpc_c = ec2_c.Vpc(id=vpc_id)
+def describe_all(client, operation, result_key, **kwargs):
+    paginator = client.get_paginator(operation)
+    for page in paginator.paginate(**kwargs):
+        for item in page.get(result_key, []):
+            yield item
 
-    vpc = dict(id=vpc_id, cidr=vpc_c.cidr_block)
+
+def collect_vpc_facts(vpc, route_tables, subnets):
+    """
+    build the `azs`/`vpc` facts of one vpc from raw `describe_*` results, classifying every route table in one pass
+    """
+    subnets_by_id = {subnet['SubnetId']: subnet for subnet in subnets}
+
+    vpc_id = vpc['VpcId']
+    facts = dict(id=vpc_id, cidr=vpc['CidrBlock'])
+    subnet_ids = {facing: set() for facing in SUBNET_GROUPS}
 
     azs = set()
-    for facing in SUBNET_GROUPS:
-        subnets = set()
-        for rt in vpc_c.route_tables.all():
+    for rt in route_tables:
+        for facing in SUBNET_GROUPS:
             is_facing_true, nat_id = check_rt_internet_facing(facing, rt)
             if not is_facing_true:
                 continue
-            for asso in rt.associations:
-                if asso.main is True:
+            for asso in rt.get('Associations', []):
+                if asso.get('Main') is True or asso.get('SubnetId') not in subnets_by_id:
                     # ignore main
                     continue
-                subnet = asso.subnet
-                subnets.add(subnet.id)
-                azs.add(subnet.availability_zone)
-
-                vpc['-'.join(['subnet', facing, subnet.availability_zone])] = [subnet.id]
-                zone = subnet.availability_zone[-1]
-                vpc[zone] = vpc.get(zone, {})
-                vpc[zone][facing] = dict(id=subnet.id, cidr=subnet.cidr_block)
+                subnet = subnets_by_id[asso['SubnetId']]
+                subnet_id, availability_zone = subnet['SubnetId'], subnet['AvailabilityZone']
+                subnet_ids[facing].add(subnet_id)
+                azs.add(availability_zone)
+
+                facts['-'.join(['subnet', facing, availability_zone])] = [subnet_id]
+                zone = availability_zone[-1]
+                facts[zone] = facts.get(zone, {})
+                facts[zone][facing] = dict(id=subnet_id, cidr=subnet['CidrBlock'])
                 if facing == 'private' and nat_id is not None:
-                    vpc[zone][facing]['nat_id'] = nat_id
+                    facts[zone][facing]['nat_id'] = nat_id
+
+    for facing in SUBNET_GROUPS:
+        facts['%s_subnets' % facing] = list(subnet_ids[facing])
+
+    return dict(azs=list(azs), vpc=facts)
+
 
-        vpc['%s_subnets' % facing] = list(subnets)
+def get_vpc_facts(vpc_id, region=None):
+    ec2 = get_client('ec2', region=region)
+    vpc_filter = [dict(Name='vpc-id', Values=[vpc_id])]
 
-    return dict(azs=list(azs), vpc=vpc)
+    vpc = ec2.describe_vpcs(VpcIds=[vpc_id])['Vpcs'][0]
+    route_tables = list(describe_all(ec2, 'describe_route_tables', 'RouteTables', Filters=vpc_filter))
+    subnets = list(describe_all(ec2, 'describe_subnets', 'Subnets', Filters=vpc_filter))
+    return collect_vpc_facts(vpc, route_tables, subnets)
+
+
+def snapshot_region(region=None):
+    """
+    vpcs, route tables and subnets of the whole region in one paginated sweep per resource, indexed by vpc id, e.g.
+
+        {'region': 'ap-southeast-2', 'vpcs': {'vpc-xxxx': {'vpc': {...}, 'route_tables': [...], 'subnets': [...]}}}
+
+    plain data only, so it can be cached and shared by every cluster of the account in the region.
+    """
+    ec2 = get_client('ec2', region=region)
+    vpcs = {}
+    for vpc in describe_all(ec2, 'describe_vpcs', 'Vpcs'):
+        vpcs[vpc['VpcId']] = dict(vpc=vpc, route_tables=[], subnets=[])
+    for key, operation, result_key in (
+        ('route_tables', 'describe_route_tables', 'RouteTables'),
+        ('subnets', 'describe_subnets', 'Subnets'),
+    ):
+        for item in describe_all(ec2, operation, result_key):
+            if item.get('VpcId') in vpcs:
+                vpcs[item['VpcId']][key].append(item)
+    return dict(region=region, vpcs=vpcs)
+
+
+def get_vpc_facts_from_snapshot(snapshot, vpc_id):
+    try:
+        resources = snapshot['vpcs'][vpc_id]
+    except KeyError:
+        raise KeyError('vpc `{}` is not in the snapshot of region `{}`'.format(vpc_id, snapshot.get('region')))
+    return collect_vpc_facts(resources['vpc'], resources['route_tables'], resources['subnets'])
@@ -1,17 +1,83 @@
+import logging
+import os
 import pickle
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class CacheModule(object):
     """
     A caching module backed by pickle files.
+
+    Each key is stored as one file in `cache_dir`, entries older than `timeout` seconds are treated as missing
+    (`timeout=0` means never expire).
     """
 
+    def __init__(self, cache_dir, timeout=0):
+        self._cache_dir = cache_dir
+        self._timeout = timeout
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir, key)
+
     def _load(self, filepath):
         # Pickle is a binary format
         with open(filepath, 'rb') as f:
             return pickle.load(f, encoding='bytes')
 
     def _dump(self, value, filepath):
-        with open(filepath, 'wb') as f:
-            # Use pickle protocol 2 which is compatible with Python 2.3+.
-            pickle.dump(value, f, protocol=2)
+        # write then rename, so concurrent readers never see a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # Use pickle protocol 2 which is compatible with Python 2.3+.
+                pickle.dump(value, f, protocol=2)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _is_expired(self, filepath):
+        if self._timeout <= 0:
+            return False
+        return time.time() - os.stat(filepath).st_mtime > self._timeout
+
+    def get(self, key):
+        filepath = self._path(key)
+        try:
+            if self._is_expired(filepath):
+                logger.info('cache expired -> `%s`', key)
+                raise KeyError(key)
+            value = self._load(filepath)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            logger.info('cache miss -> `%s`', key)
+            raise KeyError(key)
+        logger.info('cache hit -> `%s`', key)
+        return value
+
+    def set(self, key, value):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        self._dump(value, self._path(key))
+        logger.debug('cache set -> `%s`', key)
+
+    def contains(self, key):
+        filepath = self._path(key)
+        return os.path.isfile(filepath) and not self._is_expired(filepath)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            ...
+
+    def keys(self):
+        try:
+            return [k for k in os.listdir(self._cache_dir) if not k.startswith('.')]
+        except FileNotFoundError:
+            return []
+
+    def flush(self):
+        for key in self.keys():
+            self.delete(key)
@@ -1,24 +1,33 @@
+import functools
+import json
 import logging
 import os
 import re
 import shutil
 import sys
-from difflib import unified_diff
-from subprocess import getstatusoutput
-
-import yaml
-from jinja2 import Template
-
-from . import init_logger
+import threading
+import time
+from collections import OrderedDict
+from io import StringIO
+
+from . import ClusterLoggerAdapter, init_logger, shell, tracing
+from .cache import CacheModule
+from .convergence import backoff, count_ready_nodes, poll
+from .manifest import changed_inputs, dump_manifest, hash_bytes, hash_data, hash_file, hash_paths, load_manifest
 from .pre_steps import (
     ensure_aws_facts,
+    ensure_bin_deps,
     ensure_kops_k8s_version_consistency,
     ensure_region,
     ensure_ssh_pair,
     ensure_state_store,
-    ensure_tmp_dir_existing_and_empty,
+    ensure_workspace,
+    forget_verified,
+    get_kops_version,
 )
-from .utils import color_diff
+from .state_store import get_cluster_state_fingerprint
+from .utils import color_diff, run_graph, walk_files
+from .watch import watch_paths
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +49,26 @@ class Command(object):
     DIR_ROOT = os.getcwd()
     DIR_TEMPLATE = os.path.join(DIR_ROOT, 'templates')
     DIR_ADDON = os.path.join(DIR_TEMPLATE, 'addons')
-    DIR_TMP = os.path.join(DIR_ROOT, 'tmp')
+    DIR_CACHE = os.path.join(DIR_ROOT, '.kforce_cache')
+
+    # pre-steps giving the same outcome for every cluster in one process / account, run only once in fleet mode
+    PROCESS_SHARED_PRE_STEPS = (
+        'ensure_bin_deps',
+        'ensure_kops_k8s_version_consistency',
+    )
+    ACCOUNT_SHARED_PRE_STEPS = ('ensure_state_store', )
+
+    # pre-step -> pre-steps it depends on, independent pre-steps run concurrently
+    PRE_STEPS = OrderedDict(
+        [
+            ('ensure_region', ()),
+            ('ensure_workspace', ()),
+            ('ensure_dir_and_files', ()),
+            ('ensure_bin_deps', ()),
+        ]
+    )
+    PRE_STEP_WORKERS = 4
+    REQUIRED_BINS = ()
 
     @property
     def required_paths(self):
@@ -52,18 +80,35 @@ class Command(object):
         )
 
     ensure_region = ensure_region
-    ensure_kops_k8s_version_consistency = ensure_kops_k8s_version_consistency
-    ensure_tmp_dir_existing_and_empty = ensure_tmp_dir_existing_and_empty
+    ensure_bin_deps = ensure_bin_deps
+    ensure_workspace = ensure_workspace
 
     def ensure_dir_and_files(self):
         for p in self.required_paths:
             self._validate_path(p)
-            logger.debug('OK, -> %s', p)
-
-    def __init__(self, env, account_name, vpc_id, region='ap-southeast-2', debug=False):
+            self.logger.debug('OK, -> %s', p)
+
+    def __init__(
+        self,
+        env,
+        account_name,
+        vpc_id,
+        region='ap-southeast-2',
+        debug=False,
+        refresh_facts=False,
+        facts_ttl=24 * 3600,
+        facts_snapshot=False,
+        profile=False,
+        profile_trace=None,
+    ):
         init_logger(debug=debug)
 
-        logger.debug('%s.__init__: args/kwargs -> %s', self.get_name(), (env, account_name, vpc_id, region, debug))
+        logger.debug(
+            '%s.__init__: args/kwargs -> %s', self.get_name(), (
+                env, account_name, vpc_id, region, debug, refresh_facts, facts_ttl, facts_snapshot, profile,
+                profile_trace
+            )
+        )
 
         if env not in ENVS:
             raise ValueError('env -> `{}` has be in `{}`'.format(env, ENVS))
@@ -72,8 +117,20 @@ class Command(object):
         self.account_name = account_name
         self.vpc_id = vpc_id
         self.region = region
+        self.refresh_facts = refresh_facts
+        self.facts_ttl = facts_ttl
+        self.facts_snapshot = facts_snapshot  # derive facts from a snapshot of the region shared by the account
+        self.profile_report_path = tracing.report_path(profile)  # `None` unless profiling
+        self.profile_trace_path = profile_trace
+
+        self.vpc_facts = None  # see `ensure_aws_facts`
+        self.dir_tmp = None  # per invocation workspace, see `ensure_workspace`
+        self.cancel = threading.Event()  # set it to kill the running `_sh` subprocess
+        self.skipped_pre_steps = ()  # already done for this cluster, e.g. shared pre-steps in fleet mode
+        self.stdout = sys.stdout
 
         self.cluster_name = '{}-{}.k8s.local'.format(self.env, self.account_name)
+        self.logger = ClusterLoggerAdapter(logger, dict(cluster=self.cluster_name))
 
         self.state_store_name = '%s-k8s-state-store' % self.account_name  # share same bucket for cluster in same account
         self.state_store_uri = 's3://%s' % self.state_store_name
@@ -81,6 +138,9 @@ class Command(object):
         self.template_rendered_path = os.path.join(
             self.DIR_ROOT, '__generated__', '{}-{}.yaml'.format(self.env, self.account_name)
         )
+        self.build_manifest_path = os.path.join(
+            self.DIR_ROOT, '__generated__', '{}-{}.manifest.json'.format(self.env, self.account_name)
+        )
 
         self.current_vars_dir = os.path.join(self.DIR_ROOT, 'vars', self.account_name)
         self.current_value_file_path = os.path.join(self.current_vars_dir, '%s.yaml' % self.env)
@@ -90,8 +150,20 @@ class Command(object):
         self.cluster_template_path = os.path.join(self.DIR_TEMPLATE, 'cluster.yaml')
 
     def _run(self, *args, **kwargs):
-        self.__pre_run()
-        self.run(*args, **kwargs)
+        # not the owner if tracing is already on, e.g. a fleet run writes one report for all clusters
+        profiling = self.profile_report_path is not None and tracing.start()
+        try:
+            with tracing.span(self.get_name(), 'command', cluster=self.cluster_name):
+                self.__pre_run()
+                self.run(*args, **kwargs)
+        except Exception:
+            # a resource verified by an earlier run may be what is broken now, check it again next time
+            forget_verified(self)
+            raise
+        finally:
+            self.__cleanup_workspace()
+            if profiling:
+                tracing.write_report(self.profile_report_path, trace_path=self.profile_trace_path)
 
     def run(self):
         raise NotImplementedError()
@@ -101,15 +173,35 @@ class Command(object):
         return cls.__name__.lower()
 
     def __pre_run(self):
-        for i in dir(self):
-            if not i.startswith('ensure'):
-                continue
-            f = getattr(self, i)
-            if callable(f):
-                logger.debug(
-                    '__pre_run -> `%s.%s` for command -> `%s`', self.__class__.__name__, f.__name__, self.get_name()
-                )
-                f()
+        steps = [name for name in self.PRE_STEPS if name not in self.skipped_pre_steps]
+        self.logger.debug('__pre_run -> `%s` for command -> `%s`', steps, self.get_name())
+        results = run_graph(
+            tasks={
+                name: tracing.traced(getattr(self, name), name, 'pre_step', cluster=self.cluster_name)
+                for name in steps
+            },
+            dependencies={name: [d for d in self.PRE_STEPS[name] if d in steps]
+                          for name in steps},
+            max_workers=self.PRE_STEP_WORKERS,
+        )
+        self.logger.info(
+            '__pre_run: %s',
+            ', '.join('{} {:.2f}s'.format(name, r.duration) for name, r in results.items() if not r.skipped)
+        )
+
+        # report every failure, raise the first one in declared order
+        failed = [r for r in results.values() if not r.ok and not r.skipped]
+        for r in failed:
+            self.logger.error('pre-step `%s` failed for command -> `%s`: %r', r.name, self.get_name(), r.error)
+        if failed:
+            raise failed[0].error
+
+    def __cleanup_workspace(self):
+        if self.dir_tmp is None:
+            return
+        self.logger.debug('removing workspace -> %s', self.dir_tmp)
+        shutil.rmtree(self.dir_tmp, ignore_errors=True)
+        self.dir_tmp = None
 
     def _validate_path(self, p):
         if os.path.isdir(p) or os.path.isfile(p):
@@ -137,42 +229,67 @@ class Command(object):
         if not os.path.isfile(path):
             open(path, 'w').close()
 
-    def _sh(self, cmd):
+    def _sh(self, cmd, timeout=None, capture=True, stream=False):
+        """
+        run `cmd` without a shell, stdout/stderr are logged line by line as they come.
+
+        returns stdout if `capture`, or an iterator of stdout lines if `stream`.
+        """
         cmd = cmd if isinstance(cmd, (list, tuple)) else [cmd]
         cmd = [sub_flag for flag in cmd for sub_flag in flag.split(' ') if sub_flag]
         cmd_str = ' '.join(cmd)
-        logger.info(
+        self.logger.info(
             '_sh: env -> `%s`, account -> `%s`, \n\tcmd -> `%s`, \n\tcmd_splitted -> %s', self.env, self.account_name,
             cmd, cmd_str
         )
-        exitcode, data = getstatusoutput(cmd_str)
-        logger.debug('exitcode -> %s, data -> %s', exitcode, data)
-        if exitcode != 0:
-            logger.error('cmd -> %s, exitcode -> %s', cmd_str, exitcode)
-            raise RuntimeError(data)
-        return data
-
-    def _kops_cmd(self, args):
+        log_level = logging.DEBUG if capture is True or stream is True else logging.INFO
+        if stream is True:
+            return self.__sh_stream(cmd, timeout=timeout, log_level=log_level)
+        try:
+            with self.__sh_span(cmd):
+                return shell.run(
+                    cmd, timeout=timeout, cancel=self.cancel, capture=capture, log_level=log_level, log=self.logger
+                )
+        except shell.ShellError as e:
+            self.logger.error('cmd -> %s, exitcode -> %s', cmd_str, e.exitcode)
+            raise
+
+    def __sh_stream(self, cmd, timeout, log_level):
+        try:
+            with self.__sh_span(cmd):
+                for name, line in shell.stream(
+                    cmd, timeout=timeout, cancel=self.cancel, log_level=log_level, log=self.logger
+                ):
+                    if name == shell.STDOUT:
+                        yield line
+        except shell.ShellError as e:
+            self.logger.error('cmd -> %s, exitcode -> %s', ' '.join(cmd), e.exitcode)
+            raise
+
+    def __sh_span(self, cmd):
+        """span of one command, named after the binary and its first sub command, e.g. `kops get`"""
+        binary = os.path.basename(cmd[0] or '')
+        sub_cmds = [c for c in cmd[1:] if not c.startswith('-')][:1]
+        return tracing.span(' '.join([binary] + sub_cmds), 'sh', cluster=self.cluster_name, cmd=' '.join(cmd))
+
+    def _kops_cmd(self, args, **kwargs):
         args = args if isinstance(args, (list, tuple)) else [args]
         required_global_flags = ' --name={name} --state={state} '.format(
             name=self.cluster_name, state=self.state_store_uri
         )
         args.insert(0, shutil.which('kops'))
         args.append(required_global_flags)
-        return self._sh(args)
+        return self._sh(args, **kwargs)
 
-    def _kubectl_cmd(self, args):
+    def _kubectl_cmd(self, args, **kwargs):
         args = args if isinstance(args, (list, tuple)) else [args]
         kubectl = shutil.which('kubectl')
 
-        # ensure current context correct
-        use_context_args = [kubectl, 'config', 'use-context', self.cluster_name]
-        logger.debug('doing -> %s', ' '.join(use_context_args))
-        self._sh(use_context_args)
-
+        # pin the context per call rather than `kubectl config use-context`, which changes the global kubeconfig
         if args[0] is not kubectl:
             args.insert(0, kubectl)
-        return self._sh(args)
+        args.insert(1, '--context=%s' % self.cluster_name)
+        return self._sh(args, **kwargs)
 
     def list_dir_safe(self, path):
         try:
@@ -202,7 +319,7 @@ class New(Command):
                 existing_files = os.listdir(to_dir)
                 for f in file_list:
                     assert f in existing_files
-                logger.info(
+                self.logger.info(
                     'initialize skipped coz all template are there, to reset all templates, run this cmd with `force=True`'
                 )
                 return
@@ -210,7 +327,7 @@ class New(Command):
                 ...
 
         # ensure template
-        logger.info('copying templates to ->\n\t%s', '\n\t'.join([os.path.join(to_dir, f) for f in file_list]))
+        self.logger.info('copying templates to ->\n\t%s', '\n\t'.join([os.path.join(to_dir, f) for f in file_list]))
         shutil.rmtree(to_dir)
         shutil.copytree(self.DIR_RAW_TEMPLATE, to_dir)
 
@@ -226,7 +343,7 @@ class New(Command):
         self._ensure_file(os.path.join(self.current_vars_dir, '%s.yaml' % self.env), force=force)
 
     def run(self, force=False):
-        logger.info('%s.run: force -> %s', self.get_name(), force)
+        self.logger.info('%s.run: force -> %s', self.get_name(), force)
         self.__initialize_templates(force=force)
         self.__initialize_vars(force=force)
         self._ensure_dir(os.path.join(self.DIR_ROOT, '__generated__'), force=force)
@@ -235,48 +352,201 @@ class New(Command):
 class Build(Command):
 
     ensure_aws_facts = ensure_aws_facts
+    ensure_kops_k8s_version_consistency = ensure_kops_k8s_version_consistency
+
+    PRE_STEPS = OrderedDict(
+        Command.PRE_STEPS,
+        ensure_kops_k8s_version_consistency=('ensure_bin_deps', ),
+        ensure_aws_facts=('ensure_region', ),
+    )
+    REQUIRED_BINS = ('kops', )
+
+    rendered_spec = None  # content of the generated file once rendered by this command, see `Plan`
+
+    KOPS_TEMPLATE_SEPARATOR = '---'  # line `kops toolbox template` prints between two rendered template files
+    RENDER_WORKERS = 4  # template files rendered concurrently with `per_ig`
 
     @property
     def required_paths(self):
-        return super().required_paths + (
-            self.DIR_TMP,
-            self.current_vars_dir,
-        )
-
-    def run(self):
-        logger.info('%s.run...', self.get_name())
+        return super().required_paths + (self.current_vars_dir, )
+
+    def run(self, force=False, per_ig=False):
+        """
+        `force` - render even if the inputs are unchanged,
+        `per_ig` - render every instance group file on its own and reuse the cached output of the unchanged ones,
+        for clusters with many instance groups, the generated file is the same.
+        """
+        self.logger.info('%s.run: force -> %s, per_ig -> %s', self.get_name(), force, per_ig)
+
+        with tracing.span('hash inputs', 'render', cluster=self.cluster_name):
+            inputs = self.__build_inputs()
+        manifest = load_manifest(self.build_manifest_path)
+        changed = changed_inputs(manifest.get('inputs', {}), inputs)
+        if force is False and not changed and manifest.get('output') == self.__hash_rendered():
+            self.logger.info(
+                '%s.run: inputs unchanged, `%s` is up to date', self.get_name(), self.template_rendered_path
+            )
+            return
+        if manifest:
+            self.logger.info('%s.run: rebuilding, changed inputs -> \n\t%s', self.get_name(), '\n\t'.join(changed))
+
+        with tracing.span('kops template', 'render', cluster=self.cluster_name):
+            self.__render(per_ig=per_ig)
+        dump_manifest(self.build_manifest_path, dict(inputs=inputs, output=self.__hash_rendered()))
 
-        cmd = 'toolbox template --format-yaml=true '
-        cmd += ''.join([' --values ' + f for f in [self.__build_value_file(), self.current_value_file_path]])
-        cmd += ''.join(
-            [
-                ' --template ' + f for f in (self.cluster_template_path, self.current_ig_dir) \
-                if os.path.isfile(f) or self.list_dir_safe(f)
-            ]
+    @property
+    def input_paths(self):
+        """files and dirs the generated template is rendered from"""
+        return (
+            self.cluster_template_path,
+            os.path.join(self.DIR_TEMPLATE, 'values.yaml.j2'),
+            self.current_value_file_path,
+            self.current_ig_dir,
+            self.cluster_snippets_dir,
+            self.current_snippets_dir,
         )
-        # cmd += ' --template %s' % self.cluster_template_path
 
-        cmd += ' --snippets ' + self.cluster_snippets_dir
+    def __build_inputs(self):
+        inputs = hash_paths(self.input_paths, root=self.DIR_ROOT)
+        inputs['vpc_facts'] = hash_data(self.vpc_facts)
+        inputs['kops_version'] = get_kops_version(self)
+        return inputs
+
+    def __hash_rendered(self):
+        try:
+            return hash_file(self.template_rendered_path)
+        except FileNotFoundError:
+            return None
+
+    def __render(self, per_ig=False):
+        from .validator import validate_spec, validate_values
+
+        with tracing.span('values file', 'render', cluster=self.cluster_name):
+            values = [self.__build_value_file(), self.current_value_file_path]
+        with tracing.span('validate values', 'render', cluster=self.cluster_name):
+            validate_values(values, kops_version=get_kops_version(self))
+        templates = [
+            f for f in (self.cluster_template_path, self.current_ig_dir) if os.path.isfile(f) or self.list_dir_safe(f)
+        ]
+        snippets = [self.cluster_snippets_dir]
         try:
             os.listdir(self.current_snippets_dir)
-            cmd += ' --snippets ' + self.current_snippets_dir
+            snippets.append(self.current_snippets_dir)
         except FileNotFoundError:
             ...
-        data = self._kops_cmd(cmd)
-        with open(self.template_rendered_path, 'w') as f:
-            f.write('---\n\n')
-            f.write(data[data.index('apiVersion'):])
+        if per_ig is True:
+            lines = self.__render_fragments(values, templates, snippets)
+        else:
+            lines = self.__kops_template(values, templates, snippets)
+
+        # stream kops output into the generated file, skipping any log noise before the first document
+        tmp_path = self.template_rendered_path + '.tmp'
+        # the whole spec is kept in memory for the next stage, unless rendering per ig to keep memory flat
+        chunks = ['---\n\n'] if per_ig is False else None
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write('---\n\n')
+                started = False
+                for line in lines:
+                    if started is True:
+                        line = '\n' + line
+                    elif 'apiVersion' in line:
+                        line, started = line[line.index('apiVersion'):], True
+                    else:
+                        continue
+                    f.write(line)
+                    if chunks is not None:
+                        chunks.append(line)
+            if started is False:
+                raise RuntimeError('no `apiVersion` found in `kops toolbox template` output')
+            os.replace(tmp_path, self.template_rendered_path)
+            self.rendered_spec = None if chunks is None else ''.join(chunks)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                ...
+            raise
+
+        # kept for inspection when invalid, the build manifest is not updated so the next build renders again
+        with tracing.span('validate spec', 'render', cluster=self.cluster_name):
+            spec = self.rendered_spec
+            if spec is None:
+                with open(self.template_rendered_path) as f:
+                    spec = f.read()
+            validate_spec(
+                spec,
+                source=self.template_rendered_path,
+                vpc_facts=self.vpc_facts,
+                kops_version=get_kops_version(self),
+            )
+
+    def __kops_template(self, values, templates, snippets):
+        cmd = 'toolbox template --format-yaml=true '
+        cmd += ''.join([' --values ' + f for f in values])
+        cmd += ''.join([' --template ' + f for f in templates])
+        cmd += ''.join([' --snippets ' + f for f in snippets])
+        return self._kops_cmd(cmd, stream=True)
+
+    def __render_fragments(self, values, templates, snippets):
+        """
+        the lines `kops toolbox template` prints for `templates`, put together from every template file rendered on its
+        own; the output of a file is cached by content, so only files changed since the last build are rendered.
+        """
+        shared = hash_data(
+            [get_kops_version(self), [hash_file(f) for f in values],
+             hash_paths(snippets, root=self.DIR_ROOT)]
+        )
+        keys = OrderedDict((f, hash_data([shared, hash_file(f)])) for f in walk_files(templates))
+        # dot prefixed, so `CacheModule` sharing the dir does not take it as a key
+        cache = CacheModule(os.path.join(self.DIR_CACHE, '.fragments', self.cluster_name))
+
+        missing = [f for f, key in keys.items() if not cache.contains(key)]
+        self.logger.info('%s: rendering %s of %s template(s)', self.get_name(), len(missing), len(keys))
+        results = run_graph(
+            tasks={f: self.__render_fragment_task(values, f, snippets, cache, keys[f])
+                   for f in missing},
+            dependencies={},
+            max_workers=self.RENDER_WORKERS,
+        )
+        failed = [r for r in results.values() if not r.ok]
+        if failed:
+            raise failed[0].error
+        for key in set(cache.keys()) - set(keys.values()):
+            cache.delete(key)
+
+        for i, key in enumerate(keys.values()):
+            if i > 0:
+                yield self.KOPS_TEMPLATE_SEPARATOR
+            for line in cache.get(key):
+                yield line
+
+    def __render_fragment_task(self, values, template, snippets, cache, key):
+
+        def render():
+            lines = list(self.__kops_template(values, [template], snippets))
+            # log noise is only ever printed before the first document
+            for i, line in enumerate(lines):
+                if 'apiVersion' in line:
+                    lines = [line[line.index('apiVersion'):]] + lines[i + 1:]
+                    break
+            cache.set(key, lines)
+
+        return render
 
     def __build_value_file(self):
-        with open(os.path.join(self.DIR_TEMPLATE, 'values.yaml.j2')) as f:
-            value_template = Template(f.read())
-        template_rendered = value_template.render(
+        from .renderer import render_values
+
+        template_rendered = render_values(
+            self.DIR_TEMPLATE,
+            # dot prefixed, so `CacheModule` sharing the dir does not take it as a key
+            os.path.join(self.DIR_CACHE, '.jinja'),
+            vpc_facts=self.vpc_facts,
             env=self.env,
             account_name=self.account_name,
             state_store_name=self.state_store_name,
-            vpc_facts=yaml.dump(self.vpc_facts, default_flow_style=False)
         )
-        built_value_file_path = os.path.join(self.DIR_TMP, 'values.yaml')
+        built_value_file_path = os.path.join(self.dir_tmp, 'values.yaml')
         with open(built_value_file_path, 'w') as f:
             f.write(template_rendered)
         return built_value_file_path
@@ -285,29 +555,61 @@ class Build(Command):
 class Diff(Command):
 
     ensure_state_store = ensure_state_store
+    ensure_kops_k8s_version_consistency = ensure_kops_k8s_version_consistency
+
+    PRE_STEPS = OrderedDict(
+        Command.PRE_STEPS,
+        ensure_kops_k8s_version_consistency=('ensure_bin_deps', ),
+        ensure_state_store=('ensure_region', ),
+    )
+    REQUIRED_BINS = ('kops', )
+
+    changes = None  # `{kind/name: diff lines}` of the last semantic diff
+    refresh_state = False
+    last_state = None  # `(fingerprint, state)` of the last `kops get`, kept in memory for later runs, e.g. `watch`
+    rendered_spec = None  # content of the generated file if already in memory, see `Plan`
 
     @property
     def required_paths(self):
-        return super().required_paths + (
-            self.DIR_TMP,
-            self.template_rendered_path,
-        )
-
-    def run(self):
-        logger.info('%s.run...', self.get_name())
+        return super().required_paths + (self.template_rendered_path, )
 
-        try:
-            self._validate_path(self.template_rendered_path)
-        except IOError:
-            raise IOError('Before `diff`, please `make build` first!!!')
+    def run(self, semantic=False, ignore_fields=None, refresh_state=False):
+        """
+        `semantic` - compare resources by `kind/name` as normalized mappings instead of line by line,
+        `ignore_fields` - dotted paths of server-managed fields left out of the semantic comparison,
+        `kforce.yaml_diff.SERVER_MANAGED_FIELDS` by default,
+        `refresh_state` - always run `kops get` instead of reusing the cached cluster state.
+        """
+        self.logger.info('%s.run: semantic -> %s, refresh_state -> %s', self.get_name(), semantic, refresh_state)
+        self.refresh_state = refresh_state
+
+        if self.rendered_spec is not None:
+            template_to_render = self.rendered_spec
+        else:
+            try:
+                self._validate_path(self.template_rendered_path)
+            except IOError:
+                raise IOError('Before `diff`, please `make build` first!!!')
 
-        with open(self.template_rendered_path) as f:
-            template_to_render = f.read()
+            with open(self.template_rendered_path) as f:
+                template_to_render = f.read()
 
-        current_state = self.__get_current_cluster_state()
+        current_state, state_ok = self.__get_current_cluster_state()
         if 'No cluster found' in current_state:
-            logger.info('No existing cluster named `%s` found!', self.cluster_name)
-            current_state = ''
+            self.logger.info('No existing cluster named `%s` found!', self.cluster_name)
+            current_state, state_ok = '', True
+
+        if semantic is True:
+            if state_ok is False:
+                # the error output is not a cluster spec, comparing against it would show every resource as new
+                raise RuntimeError(
+                    'failed to get current state of cluster `{}`:\n{}'.format(self.cluster_name, current_state)
+                )
+            self.__semantic_diff(current_state, template_to_render, ignore_fields)
+            return
+
+        from difflib import unified_diff
+
         diff_result = unified_diff(
             current_state.splitlines(),
             template_to_render.splitlines(),
@@ -315,26 +617,116 @@ class Diff(Command):
             tofile=self.template_rendered_path
         )
         for line in color_diff(diff_result):
-            sys.stdout.write('\n' + line)
+            self.stdout.write('\n' + line)
+
+    def __semantic_diff(self, current_state, template_to_render, ignore_fields):
+        from .yaml_diff import SERVER_MANAGED_FIELDS, diff_documents, load_documents
+
+        if ignore_fields is None:
+            ignore_fields = SERVER_MANAGED_FIELDS
+        elif isinstance(ignore_fields, str):
+            ignore_fields = [f.strip() for f in ignore_fields.split(',') if f.strip()]
+        self.changes = OrderedDict(
+            diff_documents(
+                load_documents(current_state, source='current_state'),
+                load_documents(template_to_render, source=self.template_rendered_path),
+                ignore_fields,
+            )
+        )
+        for key, lines in self.changes.items():
+            self.stdout.write('\n\n==> %s' % key)
+            for line in color_diff(lines):
+                self.stdout.write('\n' + line)
+        self.stdout.write('\n\n%s resource(s) changed\n' % len(self.changes))
 
     def __get_current_cluster_state(self):
+        """returns `(state, ok)`, `state` is the error output of `kops get` when not `ok`"""
+        # `kops get` is slow, reuse its last output as long as the cluster config in the state store is unchanged
+        cache = CacheModule(self.DIR_CACHE)
+        cache_key = 'cluster_state-' + self.cluster_name
+        fingerprint = None if self.refresh_state is True else self.__get_state_fingerprint()
+        if fingerprint:
+            if self.last_state is not None and self.last_state[0] == fingerprint:
+                return self.last_state[1], True
+            try:
+                cached = cache.get(cache_key)
+                if cached['fingerprint'] == fingerprint:
+                    self.last_state = (fingerprint, cached['state'])
+                    return cached['state'], True
+                self.logger.info('state store of `%s` changed since last `kops get`', self.cluster_name)
+            except KeyError:
+                ...
+
         try:
-            return self._kops_cmd('get -o yaml')
+            state = self._kops_cmd('get -o yaml')
         except RuntimeError as e:
-            logger.warn('Either cluster `%s` does not exist(new cluster) or something wrong', self.cluster_name)
-            return e.args[0]
+            self.logger.warning(
+                'Either cluster `%s` does not exist(new cluster) or something wrong', self.cluster_name
+            )
+            return e.args[0], False
+        if fingerprint:
+            cache.set(cache_key, dict(fingerprint=fingerprint, state=state))
+            self.last_state = (fingerprint, state)
+        return state, True
+
+    def __get_state_fingerprint(self):
+        try:
+            objects = get_cluster_state_fingerprint(self.state_store_name, self.cluster_name, region=self.region)
+        except Exception as e:
+            self.logger.warning('failed to read state store of `%s`, cached state ignored: %r', self.cluster_name, e)
+            return None
+        return objects and dict(objects=objects, kops_version=get_kops_version(self))
 
 
 class Apply(Command):
+    """Apply the generated kops template to the cluster
+
+    with `--rolling-update` the instance groups needing it are rolled, masters first one at a time, then the others
+    `--max-in-flight` at a time. with `--wait` it returns only once the cluster validates and every instance group has
+    its minimum of nodes ready, polled concurrently on a backoff schedule instead of fixed sleeps.
+    """
 
+    ensure_aws_facts = ensure_aws_facts
     ensure_state_store = ensure_state_store
+    ensure_kops_k8s_version_consistency = ensure_kops_k8s_version_consistency
+
+    PRE_STEPS = OrderedDict(
+        Command.PRE_STEPS,
+        ensure_kops_k8s_version_consistency=('ensure_bin_deps', ),
+        # subnets of the spec are checked against the facts before `kops replace`
+        ensure_aws_facts=('ensure_region', ),
+        ensure_state_store=('ensure_region', ),
+    )
+    REQUIRED_BINS = ('kops', )
+
+    WAIT_BACKOFF = dict(initial=5.0, factor=2.0, maximum=60.0)  # seconds between two polls of the cluster
 
     @property
     def required_paths(self):
         return super().required_paths + (self.template_rendered_path, )
 
-    def run(self):
-        logger.info('%s.run...', self.get_name())
+    def run(self, wait=False, rolling_update=False, max_in_flight=1, timeout=30 * 60):
+        """
+        `wait` - wait for the cluster to validate and the nodes of every instance group to be ready,
+        `rolling_update` - roll the instance groups whose instances need it,
+        `max_in_flight` - instance groups rolled at a time, masters are always rolled one at a time,
+        `timeout` - seconds to wait for, rolling update included.
+        """
+        self.logger.info(
+            '%s.run: wait -> %s, rolling_update -> %s, max_in_flight -> %s', self.get_name(), wait, rolling_update,
+            max_in_flight
+        )
+        from .validator import validate_spec
+
+        start = time.time()
+        # structural mistakes fail here in milliseconds, not after `kops replace` wrote to the state store
+        with open(self.template_rendered_path) as f:
+            validate_spec(
+                f.read(),
+                source=self.template_rendered_path,
+                vpc_facts=self.vpc_facts,
+                kops_version=get_kops_version(self),
+            )
 
         cmd = 'replace -f %s  --force' % self.template_rendered_path
         self._kops_cmd(cmd)
@@ -343,41 +735,545 @@ class Apply(Command):
         ensure_ssh_pair(self)
 
         cmd = 'update cluster  --yes'
-        self._kops_cmd(cmd)
-        logger.info(
-            (
-                'Changes may require instances to restart: \n\tkops rolling-update cluster --name {name} --state {state}'
-                '\nCheck cluster status:\n\tkops validate cluster --name {name} --state {state}'
-            ).format(name=self.cluster_name, state=self.state_store_uri)
+        self._kops_cmd(cmd, capture=False)
+        if rolling_update is False and wait is False:
+            self.logger.info(
+                (
+                    'Changes may require instances to restart: \n\tkops rolling-update cluster --name {name} --state {state}'
+                    '\nCheck cluster status:\n\tkops validate cluster --name {name} --state {state}'
+                ).format(name=self.cluster_name, state=self.state_store_uri)
+            )
+            return
+
+        instance_groups = self.__get_instance_groups()
+        deadline = start + timeout
+        if rolling_update is True:
+            self.__rolling_update(instance_groups, max_in_flight, deadline)
+        if wait is True:
+            self.__wait(instance_groups, deadline)
+        self.stdout.write('`%s` converged in %.1fs\n' % (self.cluster_name, time.time() - start))
+
+    def __get_instance_groups(self):
+        """`{name: (role, min size)}` of the instance groups in the generated template"""
+        from .yaml_diff import load_documents
+
+        with open(self.template_rendered_path) as f:
+            docs = load_documents(f.read(), source=self.template_rendered_path)
+        instance_groups = OrderedDict()
+        for doc in docs.values():
+            if doc.get('kind') == 'InstanceGroup':
+                spec = doc.get('spec', {})
+                instance_groups[doc['metadata']['name']] = (spec.get('role', 'Node'), spec.get('minSize', 1))
+        return instance_groups
+
+    def __rolling_update(self, instance_groups, max_in_flight, deadline):
+        masters = [name for name, (role, _) in instance_groups.items() if role == 'Master']
+        # one master at a time keeps the etcd quorum, the other instance groups wait for all masters
+        dependencies = {name: (masters[i - 1], ) if i else () for i, name in enumerate(masters)}
+        dependencies.update({name: tuple(masters) for name in instance_groups if name not in masters})
+
+        def roll(name):
+
+            def f():
+                self._kops_cmd(
+                    'rolling-update cluster --instance-group=%s --yes' % name,
+                    capture=False,
+                    timeout=max(deadline - time.time(), 1),
+                )
+
+            return f
+
+        self.logger.info('rolling update -> %s, %s in flight', list(instance_groups), max_in_flight)
+        results = run_graph(
+            tasks={name: roll(name)
+                   for name in instance_groups},
+            dependencies=dependencies,
+            max_workers=max(max_in_flight, 1),
         )
+        self.__report('rolling update', results)
+
+    def __wait(self, instance_groups, deadline):
+        if shutil.which('kubectl') is None:
+            raise RuntimeError('`kubectl` is required to wait for the nodes to be ready')
+
+        tasks = OrderedDict(validate=self.__poll_task('validate', self.__check_validate, deadline))
+        for name, (_, min_size) in instance_groups.items():
+            tasks['ig/' + name] = self.__poll_task('ig/' + name, self.__check_instance_group(name, min_size), deadline)
+        results = run_graph(tasks=tasks, dependencies={}, max_workers=len(tasks))
+        self.__report('wait', results)
+
+    def __poll_task(self, name, check, deadline):
+
+        def f():
+            for elapsed, done, progress in poll(
+                check, timeout=deadline - time.time(), delays=backoff(**self.WAIT_BACKOFF), cancel=self.cancel
+            ):
+                self.logger.info('%s: %s after %.1fs', name, progress, elapsed)
+                if done:
+                    return elapsed
+            raise RuntimeError('not converged -> {}'.format(progress))
+
+        return f
+
+    def __check_validate(self):
+        try:
+            self._kops_cmd('validate cluster')
+        except RuntimeError as e:
+            return False, 'not valid yet, %s' % (str(e).strip().splitlines() or [''])[-1]
+        return True, 'valid'
+
+    def __check_instance_group(self, name, min_size):
+
+        def check():
+            try:
+                nodes = json.loads(self._kubectl_cmd('get nodes -l kops.k8s.io/instancegroup=%s -o json' % name))
+            except (RuntimeError, ValueError) as e:
+                return False, 'nodes unknown, %s' % (str(e).strip().splitlines() or [''])[-1]
+            ready = count_ready_nodes(nodes)
+            return ready >= min_size, '%s/%s nodes ready' % (ready, min_size)
+
+        return check
+
+    def __report(self, stage, results):
+        failed = []
+        for name, r in results.items():
+            if r.ok:
+                self.logger.info('%s: `%s` done in %.1fs', stage, name, r.duration)
+            elif r.skipped:
+                self.logger.error('%s: `%s` skipped, a dependency failed', stage, name)
+                failed.append(name)
+            else:
+                self.logger.error('%s: `%s` failed in %.1fs -> %s', stage, name, r.duration, r.error)
+                failed.append(name)
+        if failed:
+            raise RuntimeError('{} of `{}` failed -> {}'.format(stage, self.cluster_name, failed))
 
 
 class Install(Command):
-    """"Install Addons via `kubectl`"""
+    """"Install Addons via `kubectl`
+
+    an addon is applied only after the addons it depends on, declared in the addon file as
+        # kforce.io/depends-on: namespaces.yaml, crds.yaml
+
+    the content hash of every applied addon is recorded in a ledger per cluster, only addons changed since are applied,
+    bundled into one `kubectl apply` per level of dependencies.
+    """
+
+    REQUIRED_BINS = ('kubectl', )
+
+    ADDON_EXTENSIONS = ('.yaml', '.yml', '.json')
+    DEPENDS_ON_RE = re.compile(r'^#\s*kforce\.io/depends-on:(.*)$', re.MULTILINE)
+    FIELD_MANAGER = 'kforce'
+
+    def run(self, workers=4, force=False, server_side=False, prune=False):
+        """
+        `workers` - addons applied concurrently when a bundle fails and is retried addon by addon,
+        `force` - apply every addon, changed or not, e.g. after the cluster was recreated,
+        `server_side` - server-side apply, the api server merges the objects,
+        `prune` - delete the objects of addons removed since the last install.
+        """
+        self.logger.info(
+            '%s.run: workers -> %s, force -> %s, server_side -> %s, prune -> %s', self.get_name(), workers, force,
+            server_side, prune
+        )
 
-    def run(self):
-        logger.info('%s.run...', self.get_name())
+        contents = OrderedDict()
+        for addon in sorted(os.listdir(self.DIR_ADDON)):
+            if not addon.endswith(self.ADDON_EXTENSIONS):
+                self.logger.warning(
+                    '%s.run: skipping `%s`, not one of %s', self.get_name(), addon, '/'.join(self.ADDON_EXTENSIONS)
+                )
+                continue
+            with open(os.path.join(self.DIR_ADDON, addon)) as f:
+                contents[addon] = f.read()
+        dependencies = {addon: self.__get_dependencies(content) for addon, content in contents.items()}
+        for addon, deps in dependencies.items():
+            unknown = set(deps) - set(contents)
+            if unknown:
+                raise ValueError('`{}` depends on unknown -> {}'.format(addon, sorted(unknown)))
+
+        ledger = self.__load_ledger()
+        changed = [
+            addon for addon, content in contents.items()
+            if force is True or ledger.get(addon, (None, ))[0] != hash_bytes(content.encode())
+        ]
+        self.logger.info('%s of %s addon(s) changed -> %s', len(changed), len(contents), changed)
+
+        failed = self.__apply_waves(changed, dependencies, contents, ledger, workers, server_side)
+
+        removed = [addon for addon in ledger if addon not in contents]
+        if removed and prune is True:
+            self.__prune(removed, ledger)
+        elif removed:
+            self.logger.warning('addons removed since the last install, left in the cluster -> %s', removed)
+        if failed:
+            raise RuntimeError('failed to install addons -> {}'.format(failed))
+
+    def __get_dependencies(self, content):
+        return tuple(
+            dep.strip() for line in self.DEPENDS_ON_RE.findall(content) for dep in line.split(',') if dep.strip()
+        )
 
-        for addon in os.listdir(self.DIR_ADDON):
-            addon_path = os.path.join(self.DIR_ADDON, addon)
-            cmd = 'apply -f %s' % addon_path
-            logger.info('doing -> %s', cmd)
-            logger.info(self._kubectl_cmd(cmd))
+    @property
+    def __ledger_key(self):
+        return 'addons-' + self.cluster_name
 
+    def __load_ledger(self):
+        """`{addon: (content hash, content)}` of the addons applied last, content is kept for `prune`"""
+        try:
+            return CacheModule(self.DIR_CACHE).get(self.__ledger_key)
+        except KeyError:
+            return {}
+
+    def __save_ledger(self, ledger):
+        CacheModule(self.DIR_CACHE).set(self.__ledger_key, ledger)
+
+    @staticmethod
+    def __waves(addons, dependencies):
+        """`addons` grouped by level, an addon is in a later level than every one of `addons` it depends on"""
+        waves = []
+        pending = OrderedDict((addon, set(dependencies.get(addon, ())) & set(addons)) for addon in addons)
+        while pending:
+            wave = [addon for addon, deps in pending.items() if not deps & set(pending)]
+            if not wave:
+                raise ValueError('dependency cycle between -> {}'.format(sorted(pending)))
+            waves.append(wave)
+            for addon in wave:
+                del pending[addon]
+        return waves
+
+    def __apply_waves(self, addons, dependencies, contents, ledger, workers, server_side):
+        """returns the addons failed or skipped, the ledger is saved after every level applied"""
+        failed = []
+        for wave in self.__waves(addons, dependencies):
+            ready = []
+            for addon in wave:
+                if set(dependencies[addon]) & set(failed):
+                    self.logger.error('addon `%s` skipped, a dependency failed', addon)
+                    failed.append(addon)
+                else:
+                    ready.append(addon)
+            if not ready:
+                continue
 
-class CommandFactory(object):
+            start = time.time()
+            try:
+                self.__apply(ready, server_side)
+                applied = ready
+                self.logger.info('addons %s applied in %.2fs', ready, time.time() - start)
+            except Exception as e:
+                if len(ready) == 1:
+                    self.logger.error('addon `%s` failed in %.2fs -> %s', ready[0], time.time() - start, e)
+                    failed.extend(ready)
+                    continue
+                # find out which addon broke the bundle, the others still get applied
+                self.logger.warning('bundle of %s failed, applying them one by one -> %s', ready, e)
+                results = run_graph(
+                    tasks={addon: functools.partial(self.__apply, [addon], server_side)
+                           for addon in ready},
+                    dependencies={},
+                    max_workers=workers,
+                )
+                applied = [addon for addon, r in results.items() if r.ok]
+                for addon, r in results.items():
+                    if r.ok:
+                        self.logger.info('addon `%s` applied in %.2fs', addon, r.duration)
+                    else:
+                        self.logger.error('addon `%s` failed in %.2fs -> %s', addon, r.duration, r.error)
+                        failed.append(addon)
+
+            for addon in applied:
+                ledger[addon] = (hash_bytes(contents[addon].encode()), contents[addon])
+            self.__save_ledger(ledger)
+        return failed
+
+    def __apply(self, addons, server_side):
+        args = ['apply']
+        if server_side is True:
+            args += ['--server-side', '--field-manager=%s' % self.FIELD_MANAGER]
+        for addon in addons:
+            args += ['-f', os.path.join(self.DIR_ADDON, addon)]
+        self.logger.info('doing -> %s', ' '.join(args))
+        self.logger.info(self._kubectl_cmd(args))
+
+    def __prune(self, removed, ledger):
+        """delete the objects of `removed` addons from their content recorded in the ledger, dependents first"""
+        dependencies = {addon: self.__get_dependencies(ledger[addon][1]) for addon in removed}
+        args = ['delete', '--ignore-not-found']
+        for wave in reversed(self.__waves(removed, dependencies)):
+            for addon in wave:
+                path = os.path.join(self.dir_tmp, addon)
+                with open(path, 'w') as f:
+                    f.write(ledger[addon][1])
+                args += ['-f', path]
+        self.logger.info('doing -> %s', ' '.join(args))
+        self.logger.info(self._kubectl_cmd(args))
+        for addon in removed:
+            del ledger[addon]
+        self.__save_ledger(ledger)
+        self.logger.info('addons pruned -> %s', removed)
+
+
+class Watch(Command):
+    """Rebuild and diff the cluster every time its templates or vars change
+
+    pre-steps run once, their outcome (facts, kops version, state store) is kept in memory for every later rebuild.
+    """
 
-    __enabled_cmds = (
-        New,
-        Build,
-        Diff,
-        Apply,
-        Install,
+    ensure_aws_facts = ensure_aws_facts
+    ensure_state_store = ensure_state_store
+    ensure_kops_k8s_version_consistency = ensure_kops_k8s_version_consistency
+
+    PRE_STEPS = OrderedDict(
+        Command.PRE_STEPS,
+        ensure_kops_k8s_version_consistency=('ensure_bin_deps', ),
+        ensure_aws_facts=('ensure_region', ),
+        ensure_state_store=('ensure_region', ),
     )
+    REQUIRED_BINS = ('kops', )
+
+    BUILD_COMMAND = Build
+    DIFF_COMMAND = Diff
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.build_cmd = self.BUILD_COMMAND(*args, **kwargs)
+        self.diff_cmd = self.DIFF_COMMAND(*args, **kwargs)
+
+    @property
+    def required_paths(self):
+        return super().required_paths + (self.current_vars_dir, )
+
+    @property
+    def watched_paths(self):
+        return self.build_cmd.input_paths
+
+    def run(self, interval=1.0, semantic=True, iterations=None):
+        """
+        `interval` - seconds between two polls of the templates and vars,
+        `semantic` - diff resources by `kind/name`, see `diff --semantic`,
+        `iterations` - polls before returning, forever by default.
+        """
+        self.logger.info('%s.run: interval -> %s, semantic -> %s', self.get_name(), interval, semantic)
+        if iterations == 0:
+            # nothing watched afterwards, e.g. the first pass of `kforce fleet watch`, so failures are raised
+            self.refresh(semantic=semantic)
+            return
+
+        self.__refresh_logged(semantic)
+        try:
+            for changes in watch_paths(
+                {self.cluster_name: self.watched_paths}, interval=interval, iterations=iterations, cancel=self.cancel
+            ):
+                self.logger.info('%s.run: changed -> \n\t%s', self.get_name(), '\n\t'.join(changes[self.cluster_name]))
+                self.__refresh_logged(semantic)
+        except KeyboardInterrupt:
+            self.logger.info('%s.run: stopped', self.get_name())
+
+    def refresh(self, semantic=True):
+        """build then diff, `build` is incremental so it is a no-op if the change does not affect the output"""
+        self.build_cmd.vpc_facts = self.vpc_facts
+        for cmd, kwargs in ((self.build_cmd, dict()), (self.diff_cmd, dict(semantic=semantic))):
+            # pre-steps are done by this command already, only the scratch workspace is needed per run
+            cmd.skipped_pre_steps = tuple(name for name in cmd.PRE_STEPS if name != 'ensure_workspace')
+            cmd.stdout = self.stdout
+            cmd._run(**kwargs)
+
+    def __refresh_logged(self, semantic):
+        # a typo in a template being edited must not end the watch
+        try:
+            self.refresh(semantic=semantic)
+        except Exception as e:
+            self.logger.error('%s.run: rebuild failed, waiting for the next change -> %r', self.get_name(), e)
+
+
+class Plan(Command):
+    """Build then semantic diff in one process
+
+    pre-steps run once for both stages, the facts and the rendered spec are handed from one stage to the next
+    in memory.
+    """
+
+    ensure_aws_facts = ensure_aws_facts
+    ensure_state_store = ensure_state_store
+    ensure_kops_k8s_version_consistency = ensure_kops_k8s_version_consistency
+
+    PRE_STEPS = OrderedDict(
+        Command.PRE_STEPS,
+        ensure_kops_k8s_version_consistency=('ensure_bin_deps', ),
+        ensure_aws_facts=('ensure_region', ),
+        ensure_state_store=('ensure_region', ),
+    )
+    REQUIRED_BINS = ('kops', )
+
+    BUILD_COMMAND = Build
+    DIFF_COMMAND = Diff
+
+    changes = None  # `{kind/name: diff lines}` of the plan
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.build_cmd = self.BUILD_COMMAND(*args, **kwargs)
+        self.diff_cmd = self.DIFF_COMMAND(*args, **kwargs)
+
+    @property
+    def required_paths(self):
+        return super().required_paths + (self.current_vars_dir, )
+
+    def run(self, force=False, ignore_fields=None, per_ig=False):
+        """
+        `force` - render even if the inputs are unchanged,
+        `ignore_fields` - see `diff --ignore-fields`,
+        `per_ig` - see `build --per-ig`.
+        """
+        self.logger.info('%s.run: force -> %s', self.get_name(), force)
+        self.plan(force=force, ignore_fields=ignore_fields, per_ig=per_ig)
+
+    def plan(self, force=False, ignore_fields=None, per_ig=False):
+        self._run_stage(self.build_cmd, force=force, per_ig=per_ig)
+        self.diff_cmd.rendered_spec = self.build_cmd.rendered_spec
+        self._run_stage(self.diff_cmd, semantic=True, ignore_fields=ignore_fields)
+        self.changes = self.diff_cmd.changes
+        return self.changes
+
+    def _run_stage(self, cmd, **kwargs):
+        """`cmd.run` sharing the outcome of the pre-steps of this command, instead of running its own"""
+        for name in ('vpc_facts', 'dir_tmp', 'stdout', 'cancel'):
+            setattr(cmd, name, getattr(self, name))
+        with tracing.span(cmd.get_name(), 'stage', cluster=self.cluster_name):
+            cmd.run(**kwargs)
+
+
+class Up(Plan):
+    """Build, semantic diff then apply in one process, apply is skipped if nothing changed"""
+
+    APPLY_COMMAND = Apply
+
+    stdin = sys.stdin
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.apply_cmd = self.APPLY_COMMAND(*args, **kwargs)
+
+    def run(self, force=False, ignore_fields=None, per_ig=False, approve=False, wait=False, rolling_update=False):
+        """
+        `force` - render even if the inputs are unchanged,
+        `ignore_fields` - see `diff --ignore-fields`,
+        `per_ig` - see `build --per-ig`,
+        `approve` - ask for a confirmation between diff and apply,
+        `wait`, `rolling_update` - see `apply --wait --rolling-update`.
+        """
+        self.logger.info('%s.run: force -> %s, approve -> %s', self.get_name(), force, approve)
+        changes = self.plan(force=force, ignore_fields=ignore_fields, per_ig=per_ig)
+        if not changes:
+            self.logger.info('%s.run: `%s` is up to date, apply skipped', self.get_name(), self.cluster_name)
+            return
+        if approve is True and not self.__confirm(changes):
+            self.logger.info('%s.run: apply declined', self.get_name())
+            return
+        self._run_stage(self.apply_cmd, wait=wait, rolling_update=rolling_update)
+
+    def __confirm(self, changes):
+        self.stdout.write('\napply %s change(s) to `%s`? [y/N] ' % (len(changes), self.cluster_name))
+        self.stdout.flush()
+        return self.stdin.readline().strip().lower() in ('y', 'yes')
+
+
+class Status(Command):
+    """Health of the cluster: `kops validate cluster`, ready nodes and drift of the generated template from the cluster
+
+    the checks run concurrently, each one bounded by `--timeout`. every call pins the cluster with `--name` /
+    `--context` instead of switching the kubeconfig context, so clusters can be checked concurrently, see
+    `kforce fleet status`.
+    """
+
+    REQUIRED_BINS = ('kops', 'kubectl')
+
+    DIFF_COMMAND = Diff
+    CHECKS = ('validation', 'nodes', 'drift')
+    TIMEOUT = 'timeout'
+
+    health = None  # `{check: outcome}` of the last run
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.diff_cmd = self.DIFF_COMMAND(*args, **kwargs)
+
+    def run(self, timeout=60):
+        """`timeout` - seconds every check is given"""
+        self.logger.info('%s.run: timeout -> %s', self.get_name(), timeout)
+        results = run_graph(
+            tasks={name: functools.partial(getattr(self, '_check_' + name), timeout)
+                   for name in self.CHECKS},
+            dependencies={},
+            max_workers=len(self.CHECKS),
+        )
+        self.health = OrderedDict()
+        for name, r in results.items():
+            if r.ok:
+                self.health[name] = r.result
+            elif isinstance(r.error, shell.ShellTimeout) or (name == 'drift' and self.diff_cmd.cancel.is_set()):
+                self.health[name] = self.TIMEOUT
+            else:
+                self.logger.warning('%s.run: `%s` check failed -> %r', self.get_name(), name, r.error)
+                self.health[name] = 'error'
+        self.stdout.write(', '.join('%s -> %s' % i for i in self.health.items()) + '\n')
+
+    def _check_validation(self, timeout):
+        try:
+            self._kops_cmd('validate cluster', timeout=timeout)
+        except shell.ShellTimeout:
+            raise
+        except shell.ShellError:
+            return 'failed'
+        return 'ok'
+
+    def _check_nodes(self, timeout):
+        nodes = json.loads(self._kubectl_cmd('get nodes -o json', timeout=timeout))
+        return '%s/%s ready' % (count_ready_nodes(nodes), len(nodes.get('items', ())))
+
+    def _check_drift(self, timeout):
+        if not os.path.isfile(self.template_rendered_path):
+            return 'not built'
+        cmd = self.diff_cmd
+        for name in ('dir_tmp', 'vpc_facts'):
+            setattr(cmd, name, getattr(self, name))
+        cmd.stdout = StringIO()
+        cmd.cancel.clear()
+        # the diff runs several subprocesses, the deadline kills whichever one is running
+        timer = threading.Timer(timeout, cmd.cancel.set)
+        timer.start()
+        try:
+            cmd.run(semantic=True)
+        finally:
+            timer.cancel()
+        return '%s change(s)' % len(cmd.changes) if cmd.changes else 'none'
+
+
+def _command_property(klass):
+
+    def get(self):
+        # commands are only created once actually accessed. `--help` accesses every one of them to list their docs,
+        # which is fine as creating a command is cheap: no I/O and no heavy imports until it runs.
+        if klass not in self._cmds:
+            self._cmds[klass] = klass(**self._kwargs)
+        return self._cmds[klass]._run
+
+    return property(get, doc=klass.__doc__)
+
+
+class CommandFactory(object):
 
-    def __register(self, **kwargs):
-        for klass in self.__enabled_cmds:
-            setattr(self, klass.get_name(), klass(**kwargs)._run)
+    new = _command_property(New)
+    build = _command_property(Build)
+    diff = _command_property(Diff)
+    apply = _command_property(Apply)
+    install = _command_property(Install)
+    watch = _command_property(Watch)
+    plan = _command_property(Plan)
+    up = _command_property(Up)
+    status = _command_property(Status)
 
     def __init__(self, **kwargs):
-        self.__register(**kwargs)
+        self._kwargs = kwargs
+        self._cmds = {}
@@ -0,0 +1,45 @@
+import time
+
+
+def backoff(initial=2.0, factor=2.0, maximum=30.0):
+    """delays between two polls, from `initial` seconds multiplied by `factor` every time, up to `maximum`"""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
+def poll(check, timeout, delays=None, cancel=None):
+    """
+    call `check` -> `(done, progress)` until it is done, sleeping the next of `delays` in between,
+    yield `(elapsed seconds, done, progress)` after every call.
+
+    stops once done, `timeout` seconds passed or `cancel` - a `threading.Event` - is set.
+    """
+    delays = backoff() if delays is None else iter(delays)
+    start = time.time()
+    while True:
+        done, progress = check()
+        elapsed = time.time() - start
+        yield elapsed, done, progress
+        if done:
+            return
+        remaining = timeout - elapsed
+        if remaining <= 0:
+            return
+        delay = min(next(delays), remaining)
+        if cancel is not None:
+            if cancel.wait(delay):
+                return
+        else:
+            time.sleep(delay)
+
+
+def count_ready_nodes(nodes):
+    """nodes with a `Ready` condition of `True` in `nodes`, the output of `kubectl get nodes -o json`"""
+    return sum(
+        1 for node in nodes.get('items', ()) if any(
+            c.get('type') == 'Ready' and c.get('status') == 'True'
+            for c in node.get('status', {}).get('conditions', ())
+        )
+    )
@@ -0,0 +1,218 @@
+import logging
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+import yaml
+
+from . import init_logger, tracing
+from .commands import Build, Diff, Status, Watch
+from .utils import format_table
+from .watch import watch_paths
+
+logger = logging.getLogger(__name__)
+
+ClusterResult = namedtuple('ClusterResult', ('cluster', 'command', 'ok', 'duration', 'output', 'error'))
+
+
+def load_clusters(path):
+    """
+    clusters manifest, e.g.
+
+        defaults:
+          region: ap-southeast-2
+        clusters:
+          - {env: s, account_name: aws-account1, vpc_id: vpc-xxxx}
+          - {env: p, account_name: aws-account1, vpc_id: vpc-yyyy}
+    """
+    with open(path) as f:
+        manifest = yaml.safe_load(f) or {}
+    defaults = manifest.get('defaults') or {}
+    clusters = [dict(defaults, **c) for c in manifest.get('clusters') or []]
+    if not clusters:
+        raise ValueError('no cluster defined in manifest -> `{}`'.format(path))
+    return clusters
+
+
+class Fleet(object):
+    """Run commands for every cluster in a manifest on a bounded worker pool"""
+
+    def __init__(
+        self,
+        manifest,
+        workers=4,
+        debug=False,
+        refresh_facts=False,
+        facts_snapshot=True,
+        profile=False,
+        profile_trace=None,
+    ):
+        init_logger(debug=debug)
+        self.clusters = load_clusters(manifest)
+        self.workers = workers
+        self.debug = debug
+        self.refresh_facts = refresh_facts
+        # one sweep of the region for all clusters of an account instead of describing every vpc on its own
+        self.facts_snapshot = facts_snapshot
+        self.profile_report_path = tracing.report_path(profile)
+        self.profile_trace_path = profile_trace
+        self.stdout = sys.stdout
+        self.results = []
+
+    def build(self):
+        return self.__run(Build)
+
+    def diff(self):
+        return self.__run(Diff)
+
+    def status(self, timeout=60):
+        """
+        validation, ready nodes and drift of every cluster, checked concurrently, see `kforce status`.
+
+        `timeout` - seconds every check of a cluster is given.
+        """
+        cmds = self.__create_commands(Status)
+        start = time.time()
+        results = self.__run_commands(
+            cmds, lambda cmd: cmd._run(timeout=timeout), self.__run_shared_pre_steps(cmds), report=False
+        )
+
+        rows = []
+        for r in results:
+            health = cmds[r.cluster].health or {}
+            row = [r.cluster] + [health.get(check, 'error') for check in Status.CHECKS] + ['%.2fs' % r.duration]
+            rows.append(row + ['' if r.ok else repr(r.error)])
+        self.stdout.write(
+            format_table(('CLUSTER', ) + tuple(c.upper() for c in Status.CHECKS) + ('DURATION', 'ERROR'), rows) + '\n'
+        )
+        unhealthy = [r.cluster for r in results if not r.ok or cmds[r.cluster].health['validation'] != 'ok']
+        elapsed = time.time() - start
+        self.stdout.write(
+            '\n{} cluster(s), {} unhealthy, {:.2f}s in total\n'.format(len(results), len(unhealthy), elapsed)
+        )
+        if unhealthy:
+            raise RuntimeError('unhealthy clusters -> {}'.format(unhealthy))
+
+    def watch(self, interval=1.0, semantic=True, iterations=None):
+        """
+        build and diff every cluster, then rebuild and diff only the clusters whose templates or vars change,
+        see `kforce watch`.
+        """
+        cmds = self.__create_commands(Watch)
+        # first pass runs the pre-steps, their outcome is kept by each command for every later rebuild
+        results = self.__run_commands(
+            cmds,
+            lambda cmd: cmd._run(interval=interval, semantic=semantic, iterations=0),
+            self.__run_shared_pre_steps(cmds),
+        )
+        watched = OrderedDict((r.cluster, cmds[r.cluster]) for r in results if r.ok)
+        if not watched:
+            raise RuntimeError('`watch` failed for every cluster')
+
+        try:
+            for changes in watch_paths(
+                OrderedDict((name, cmd.watched_paths) for name, cmd in watched.items()),
+                interval=interval,
+                iterations=iterations,
+            ):
+                logger.info('fleet: changed -> %s', {name: files for name, files in changes.items()})
+                self.__run_commands(
+                    OrderedDict((name, cmd) for name, cmd in watched.items() if name in changes),
+                    lambda cmd: cmd.refresh(semantic=semantic),
+                )
+        except KeyboardInterrupt:
+            logger.info('fleet: watch stopped')
+
+    def __create_commands(self, klass):
+        cmds = OrderedDict()
+        for cluster in self.clusters:
+            kwargs = dict(debug=self.debug, refresh_facts=self.refresh_facts, facts_snapshot=self.facts_snapshot)
+            kwargs.update(cluster)
+            cmd = klass(**kwargs)
+            cmds[cmd.cluster_name] = cmd
+        return cmds
+
+    def __run_shared_pre_steps(self, cmds):
+        """run pre-steps shared by process / account once, returns errors by cluster name"""
+        errors = {}
+        groups = OrderedDict([(None, list(cmds.values()))])  # `None` -> the whole process
+        for cmd in cmds.values():
+            groups.setdefault(cmd.account_name, []).append(cmd)
+
+        for group, group_cmds in groups.items():
+            names = group_cmds[0].PROCESS_SHARED_PRE_STEPS if group is None else \
+                group_cmds[0].ACCOUNT_SHARED_PRE_STEPS
+            for name in names:
+                f = getattr(group_cmds[0], name, None)
+                if not callable(f):
+                    continue
+                logger.debug('fleet: shared pre-step `%s` for -> `%s`', name, group)
+                try:
+                    with tracing.span(name, 'pre_step', shared_by=group or 'process'):
+                        f()
+                except Exception as e:
+                    logger.error('fleet: shared pre-step `%s` failed for -> `%s`: %r', name, group, e)
+                    for cmd in group_cmds:
+                        errors.setdefault(cmd.cluster_name, e)
+                for cmd in group_cmds:
+                    cmd.skipped_pre_steps += (name, )
+        return errors
+
+    def __run_one(self, cmd, run):
+        start = time.time()
+        cmd.stdout = StringIO()
+        try:
+            run(cmd)
+            ok, error = True, None
+        except Exception as e:
+            logger.error('fleet: `%s` failed for -> `%s`: %r', cmd.get_name(), cmd.cluster_name, e)
+            ok, error = False, e
+        return ClusterResult(cmd.cluster_name, cmd.get_name(), ok, time.time() - start, cmd.stdout.getvalue(), error)
+
+    def __run(self, klass):
+        profiling = self.profile_report_path is not None and tracing.start()
+        try:
+            cmds = self.__create_commands(klass)
+            self.__run_commands(cmds, lambda cmd: cmd._run(), self.__run_shared_pre_steps(cmds))
+        finally:
+            if profiling:
+                tracing.write_report(self.profile_report_path, trace_path=self.profile_trace_path)
+        failed = [r.cluster for r in self.results if not r.ok]
+        if failed:
+            raise RuntimeError('`{}` failed for -> {}'.format(klass.get_name(), failed))
+
+    def __run_commands(self, cmds, run, errors=None, report=True):
+        """`run(cmd)` for every command not in `errors` on the worker pool, then report"""
+        start = time.time()
+        results = OrderedDict()
+        for name, error in (errors or {}).items():
+            results[name] = ClusterResult(name, cmds[name].get_name(), False, 0.0, '', error)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                (name, executor.submit(self.__run_one, cmd, run)) for name, cmd in cmds.items() if name not in results
+            ]
+            for name, future in futures:
+                results[name] = future.result()
+
+        self.results = [results[name] for name in cmds]
+        if report is True:
+            self.__report(self.results, time.time() - start)
+        return self.results
+
+    def __report(self, results, duration):
+        for r in results:
+            if r.output:
+                self.stdout.write('\n==> {} ({})\n{}\n'.format(r.cluster, r.command, r.output))
+
+        rows = [
+            (r.cluster, r.command, 'ok' if r.ok else 'failed', '%.2fs' % r.duration, '' if r.ok else repr(r.error))
+            for r in results
+        ]
+        self.stdout.write('\n' + format_table(('CLUSTER', 'COMMAND', 'STATUS', 'DURATION', 'ERROR'), rows) + '\n')
+        self.stdout.write(
+            '\n{} cluster(s), {} failed, {:.2f}s in total\n'.format(
+                len(results), len([r for r in results if not r.ok]), duration
+            )
+        )
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_data(obj):
+    return hash_bytes(json.dumps(obj, sort_keys=True, default=str).encode())
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_paths(paths, root):
+    """hash of every file under `paths` keyed by path relative to `root`, missing paths are skipped"""
+    hashes = {}
+    for path in paths:
+        if os.path.isfile(path):
+            hashes[os.path.relpath(path, root)] = hash_file(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_path = os.path.join(dirpath, filename)
+                hashes[os.path.relpath(file_path, root)] = hash_file(file_path)
+    return hashes
+
+
+def changed_inputs(old, new):
+    return sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def dump_manifest(path, manifest):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+    logger.debug('build manifest written -> %s', path)
@@ -2,41 +2,91 @@ import logging
 import os
 import re
 import shutil
-from pprint import pformat
+import tempfile
+import threading
 from base64 import urlsafe_b64encode
+from collections import OrderedDict
+from pprint import pformat
 
-import boto3
-import yaml
-from botocore.errorfactory import ClientError
-
-from .aws_facts import get_vpc_facts
+from .aws_clients import get_client
+from .aws_facts import get_vpc_facts, get_vpc_facts_from_snapshot, snapshot_region
+from .cache import CacheModule
+from .manifest import hash_data
+from .utils import run_graph
 
 logger = logging.getLogger(__name__)
 
+VERIFIED_TTL = 6 * 3600  # seconds a state store / ssh key pair checked to exist is trusted without checking again
 
-def ensure_aws_facts(self):
-    self.vpc_facts = get_vpc_facts(vpc_id=self.vpc_id)
-    logger.debug('vpc_facts -> \n%s', pformat(self.vpc_facts, indent=4, width=120))
+_kops_versions = {}  # kops binary fingerprint -> version, `kops version` is only spawned once per process
+_region_snapshots = {}  # (account, region) -> network snapshot, swept only once per process
+_region_snapshot_locks = {}
+_lock = threading.Lock()
 
 
-def ensure_kops_k8s_version_consistency(self):
-    # ensure bin dependencies
-    BIN_DEPS = (
-        'kops',
-        'kubectl',
-    )
-    for bin in BIN_DEPS:
+def ensure_aws_facts(self):
+    if self.facts_snapshot is True:
+        self.vpc_facts = _vpc_facts_from_region_snapshot(self)
+        self.logger.debug('vpc_facts -> \n%s', pformat(self.vpc_facts, indent=4, width=120))
+        return
+
+    # vpc topology rarely changes, so facts are cached on disk per account/region/vpc
+    cache = CacheModule(self.DIR_CACHE, timeout=self.facts_ttl)
+    cache_key = 'vpc_facts-{}-{}-{}'.format(self.account_name, self.region, self.vpc_id)
+    try:
+        if self.refresh_facts is True:
+            raise KeyError(cache_key)
+        self.vpc_facts = cache.get(cache_key)
+    except KeyError:
+        self.vpc_facts = get_vpc_facts(vpc_id=self.vpc_id, region=self.region)
+        cache.set(cache_key, self.vpc_facts)
+    self.logger.debug('vpc_facts -> \n%s', pformat(self.vpc_facts, indent=4, width=120))
+
+
+def _region_snapshot(self, refresh=False):
+    """network snapshot of the region, swept once per account/region and shared by all clusters in it"""
+    key = (self.account_name, self.region)
+    with _lock:
+        lock = _region_snapshot_locks.setdefault(key, threading.Lock())
+    with lock:
+        if refresh is False and key in _region_snapshots:
+            return _region_snapshots[key]
+        cache = CacheModule(self.DIR_CACHE, timeout=self.facts_ttl)
+        cache_key = 'region_snapshot-{}-{}'.format(*key)
+        try:
+            if refresh is True or self.refresh_facts is True:
+                raise KeyError(cache_key)
+            snapshot = cache.get(cache_key)
+        except KeyError:
+            snapshot = snapshot_region(region=self.region)
+            cache.set(cache_key, snapshot)
+        _region_snapshots[key] = snapshot
+        return snapshot
+
+
+def _vpc_facts_from_region_snapshot(self):
+    snapshot = _region_snapshot(self)
+    if self.vpc_id not in snapshot['vpcs']:
+        # created after the snapshot was taken
+        snapshot = _region_snapshot(self, refresh=True)
+    return get_vpc_facts_from_snapshot(snapshot, self.vpc_id)
+
+
+def ensure_bin_deps(self):
+    for bin in self.REQUIRED_BINS:
         bin_path = shutil.which(bin)
         if bin_path is None or not os.access(bin_path, os.X_OK):
             raise RuntimeError('`{}` is NOT installed!'.format(bin))
 
+
+def ensure_kops_k8s_version_consistency(self):
     kops_version = None
     k8s_version = None
     try:
         # ensure kops and k8s has same major and minor version!
-        kops_version = re.search('Version\s*([\d.]+)', self._kops_cmd('version')).group(1)
+        kops_version = get_kops_version(self)
         with open(os.path.join(self.DIR_TEMPLATE, 'values.yaml.j2')) as f:
-            k8s_version = re.search('kubernetesVersion:\s*([\d.]+)', f.read()).group(1)
+            k8s_version = re.search(r'kubernetesVersion:\s*([\d.]+)', f.read()).group(1)
         assert kops_version.split('.')[:2] == k8s_version.split('.')[:2]
     except Exception as e:
         e.args += (
@@ -49,48 +99,99 @@ def ensure_kops_k8s_version_consistency(self):
         raise e
 
 
+def get_kops_version(self):
+    # cached on disk until the kops binary itself changes
+    kops_path = shutil.which('kops')
+    if kops_path is None:
+        raise RuntimeError('`kops` is NOT installed!')
+    kops_path = os.path.realpath(kops_path)
+    stat = os.stat(kops_path)
+    cache_key = 'kops_version-' + hash_data([kops_path, stat.st_mtime, stat.st_size])
+    if cache_key not in _kops_versions:
+        cache = CacheModule(self.DIR_CACHE)
+        try:
+            _kops_versions[cache_key] = cache.get(cache_key)
+        except KeyError:
+            _kops_versions[cache_key] = re.search(r'Version\s*([\d.]+)', self._kops_cmd('version')).group(1)
+            cache.set(cache_key, _kops_versions[cache_key])
+    return _kops_versions[cache_key]
+
+
 def ensure_region(self):
     # ugly but useful
     os.environ['AWS_DEFAULT_REGION'] = os.environ.get('AWS_DEFAULT_REGION', None) or self.region
 
 
-def ensure_tmp_dir_existing_and_empty(self):
-    # ensure ./tmp is there and empty before run
-    try:
-        logger.debug('removing %s', self.DIR_TMP)
-        shutil.rmtree(self.DIR_TMP)
-    except FileNotFoundError:
-        ...
-    finally:
-        os.makedirs(self.DIR_TMP)
+def ensure_workspace(self):
+    # scratch dir owned by this invocation only, removed once the command is done
+    self.dir_tmp = tempfile.mkdtemp(prefix='kforce-{}-{}-'.format(self.env, self.account_name))
+    self.logger.debug('workspace -> %s', self.dir_tmp)
+
+
+def _verified(self):
+    return CacheModule(self.DIR_CACHE, timeout=VERIFIED_TTL)
+
+
+def _verified_keys(self):
+    return (
+        'verified-state_store-{}'.format(self.state_store_name),
+        'verified-ssh_pair-{}-{}'.format(self.region, self.cluster_name),
+    )
+
+
+def forget_verified(self):
+    """drop the records of resources verified for this cluster, so the next run checks them again"""
+    cache = _verified(self)
+    for key in _verified_keys(self):
+        if cache.contains(key):
+            cache.delete(key)
 
 
 def ensure_ssh_pair(self):
+    import yaml
+    from botocore.exceptions import ClientError
 
     # ensure aws ec2 key pair
     public_key_name = 'publicKey'
     try:
         with open(self.current_value_file_path) as f:
-            public_key_material = yaml.load(f)[public_key_name]
+            public_key_material = yaml.safe_load(f)[public_key_name]
     except (KeyError, TypeError) as e:
         e.args += ('`{}` is a required var, define it in {}'.format(public_key_name, self.current_value_file_path), )
         raise e
-    ec2_key_pair_key = self.cluster_name
-    try:
-        ec2 = boto3.client('ec2')
-        ec2.import_key_pair(KeyName=ec2_key_pair_key, PublicKeyMaterial=public_key_material)
-    except ClientError as e:
-        if e.response['Error']['Code'] != 'InvalidKeyPair.Duplicate':
-            raise e
-        logger.warn('Key pair -> `%s` is already there', ec2_key_pair_key)
 
+    # both the key pair and the kops secret almost always exist already, skip checking them again for a while
+    cache = _verified(self)
+    cache_key = _verified_keys(self)[1]
+    record = hash_data(public_key_material)
+    if cache.contains(cache_key) and cache.get(cache_key) == record:
+        self.logger.debug('ssh key pair of `%s` verified recently, skipped', self.cluster_name)
+        return
+
+    ec2_key_pair_key = self.cluster_name
     kops_default_admin_name = 'admin'
 
+    def ensure_ec2_key_pair():
+        ec2 = get_client('ec2', region=self.region)
+        try:
+            ec2.describe_key_pairs(KeyNames=[ec2_key_pair_key])
+            self.logger.debug('Key pair -> `%s` is already there', ec2_key_pair_key)
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidKeyPair.NotFound':
+                raise e
+        try:
+            ec2.import_key_pair(KeyName=ec2_key_pair_key, PublicKeyMaterial=public_key_material)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidKeyPair.Duplicate':
+                raise e
+            self.logger.warning('Key pair -> `%s` is already there', ec2_key_pair_key)
+
     def create_kops_secret_ssh_key():
         # create `kops` secret
         cmd = 'create secret sshpublickey {kops_u} '.format(kops_u=kops_default_admin_name)
         ssh_public_key_path = os.path.join(
-            self.DIR_TMP,
+            self.dir_tmp,
             urlsafe_b64encode(ec2_key_pair_key.encode()).decode() + '.pub'
         )
         with open(ssh_public_key_path, 'w') as f:
@@ -107,20 +208,48 @@ def ensure_ssh_pair(self):
                 return False
             raise e
 
-    if not is_kops_secret_ssh_key_exits():
-        create_kops_secret_ssh_key()
+    def ensure_kops_secret():
+        if not is_kops_secret_ssh_key_exits():
+            create_kops_secret_ssh_key()
+
+    # independent of each other, an aws api call and a `kops` subprocess
+    results = run_graph(
+        tasks=OrderedDict([('ec2_key_pair', ensure_ec2_key_pair), ('kops_secret', ensure_kops_secret)]),
+        dependencies={},
+        max_workers=2,
+    )
+    for r in results.values():
+        if not r.ok:
+            raise r.error
+    cache.set(cache_key, record)
 
 
 def ensure_state_store(self):
+    from botocore.exceptions import ClientError
+
+    cache = _verified(self)
+    cache_key = _verified_keys(self)[0]
+    if cache.contains(cache_key):
+        self.logger.debug('state store <%s> verified recently, skipped', self.state_store_name)
+        return
 
-    s3 = boto3.resource('s3')
-    bucket = s3.Bucket(self.state_store_name)
+    s3 = get_client('s3', region=self.region)
     try:
-        bucket.create(ACL='private', CreateBucketConfiguration=dict(LocationConstraint=self.region))
-        bucket_versioning = s3.BucketVersioning(self.state_store_name)
-        bucket_versioning.enable()
+        s3.head_bucket(Bucket=self.state_store_name)
+        self.logger.debug('state store <%s> exists, ignore...', self.state_store_name)
     except ClientError as e:
-        if e.response['Error']['Code'] == 'BucketAlreadyOwnedByYou':
-            logger.debug('state store <%s> exists, ignore...', self.state_store_name)
-            return
-        raise e
+        # `403` means the bucket exists but is not ours, creating it fails with a clearer error
+        if e.response['Error']['Code'] not in ('404', 'NoSuchBucket', '403'):
+            raise e
+        try:
+            s3.create_bucket(
+                Bucket=self.state_store_name,
+                ACL='private',
+                CreateBucketConfiguration=dict(LocationConstraint=self.region),
+            )
+            s3.put_bucket_versioning(Bucket=self.state_store_name, VersioningConfiguration=dict(Status='Enabled'))
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'BucketAlreadyOwnedByYou':
+                raise e
+            self.logger.debug('state store <%s> exists, ignore...', self.state_store_name)
+    cache.set(cache_key, True)
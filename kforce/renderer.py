@@ -0,0 +1,45 @@
+import os
+import threading
+
+import yaml
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:  # libyaml is not available
+    from yaml import SafeDumper
+
+VALUES_TEMPLATE = 'values.yaml.j2'
+
+_lock = threading.Lock()
+_environments = {}
+
+
+def get_environment(template_dir, cache_dir):
+    """
+    one jinja `Environment` per template dir in this process, so a template is compiled once and reused by every
+    cluster rendered from it; compiled bytecode is persisted under `cache_dir` for the next process.
+    """
+    key = (os.path.abspath(template_dir), os.path.abspath(cache_dir))
+    with _lock:
+        if key not in _environments:
+            os.makedirs(cache_dir, exist_ok=True)
+            _environments[key] = Environment(
+                loader=FileSystemLoader(template_dir), bytecode_cache=FileSystemBytecodeCache(cache_dir)
+            )
+        return _environments[key]
+
+
+def dump_yaml(data):
+    return yaml.dump(data, Dumper=SafeDumper, default_flow_style=False)
+
+
+def render_values(template_dir, cache_dir, vpc_facts, **context):
+    """`values.yaml.j2` of `template_dir` rendered with `context` and `vpc_facts` dumped as yaml"""
+    template = get_environment(template_dir, cache_dir).get_template(VALUES_TEMPLATE)
+    return template.render(vpc_facts=dump_yaml(vpc_facts), **context)
+
+
+def reset():
+    with _lock:
+        _environments.clear()
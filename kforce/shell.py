@@ -0,0 +1,94 @@
+import logging
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+STDOUT = 'stdout'
+STDERR = 'stderr'
+
+ERROR_OUTPUT_LINES = 500  # lines of output kept for the error message of a failed command
+
+
+class ShellError(RuntimeError):
+    """`args[0]` is the tail of stdout + stderr, the same as the output `getstatusoutput` used to return"""
+
+    def __init__(self, output, exitcode=None, argv=None):
+        super().__init__(output)
+        self.exitcode = exitcode
+        self.argv = argv
+
+
+class ShellTimeout(ShellError):
+    ...
+
+
+class ShellCancelled(ShellError):
+    ...
+
+
+def _pump(name, pipe, q):
+    for line in iter(pipe.readline, ''):
+        q.put((name, line.rstrip('\n')))
+    pipe.close()
+    q.put((name, None))
+
+
+def stream(argv, timeout=None, cancel=None, log_level=logging.DEBUG, log=logger):
+    """
+    run `argv` (no shell) and yield `(stdout|stderr, line)` as soon as each line is written.
+
+    `timeout` - seconds before the process is killed and `ShellTimeout` raised,
+    `cancel` - a `threading.Event`, once set the process is killed and `ShellCancelled` raised,
+    `log` - the logger (or adapter) output lines are logged to,
+    closing the generator early kills the process as well.
+    """
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, bufsize=1)
+    q = queue.Queue()
+    for name, pipe in ((STDOUT, proc.stdout), (STDERR, proc.stderr)):
+        threading.Thread(target=_pump, args=(name, pipe, q), daemon=True).start()
+
+    deadline = None if timeout is None else time.time() + timeout
+    output_tail = deque(maxlen=ERROR_OUTPUT_LINES)
+    open_pipes = 2
+    try:
+        while open_pipes > 0:
+            if cancel is not None and cancel.is_set():
+                raise ShellCancelled('\n'.join(output_tail), argv=argv)
+            if deadline is not None and time.time() > deadline:
+                raise ShellTimeout('\n'.join(list(output_tail) + ['timed out after %ss' % timeout]), argv=argv)
+            try:
+                name, line = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if line is None:
+                open_pipes -= 1
+                continue
+            output_tail.append(line)
+            log.log(log_level, '%s -> %s', name, line)
+            yield name, line
+        try:
+            exitcode = proc.wait(timeout=None if deadline is None else max(deadline - time.time(), 0))
+        except subprocess.TimeoutExpired:
+            raise ShellTimeout('\n'.join(list(output_tail) + ['timed out after %ss' % timeout]), argv=argv)
+    finally:
+        if proc.poll() is None:
+            log.debug('killing -> %s', argv)
+            proc.kill()
+            proc.wait()
+
+    log.debug('exitcode -> %s, cmd -> %s', exitcode, argv)
+    if exitcode != 0:
+        raise ShellError('\n'.join(output_tail), exitcode=exitcode, argv=argv)
+
+
+def run(argv, timeout=None, cancel=None, capture=True, log_level=logging.DEBUG, log=logger):
+    """run `argv` to completion, returns its stdout if `capture` else `None`"""
+    stdout = []
+    for name, line in stream(argv, timeout=timeout, cancel=cancel, log_level=log_level, log=log):
+        if capture is True and name == STDOUT:
+            stdout.append(line)
+    return '\n'.join(stdout) if capture is True else None
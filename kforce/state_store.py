@@ -0,0 +1,19 @@
+import logging
+
+from .aws_clients import get_client
+from .aws_facts import describe_all
+
+logger = logging.getLogger(__name__)
+
+
+def get_cluster_state_fingerprint(bucket, cluster_name, region=None):
+    """
+    `(key, etag, last modified)` of the kops config objects of `cluster_name` in the state store, what
+    `kops get -o yaml` renders from; empty if the cluster does not exist.
+    """
+    s3 = get_client('s3', region=region)
+    fingerprint = []
+    for prefix in ('{}/config'.format(cluster_name), '{}/instancegroup/'.format(cluster_name)):
+        for obj in describe_all(s3, 'list_objects_v2', 'Contents', Bucket=bucket, Prefix=prefix):
+            fingerprint.append((obj['Key'], obj['ETag'], obj['LastModified'].isoformat()))
+    return sorted(fingerprint)
@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# `KFORCE_PROFILE=1` (or a report path) profiles any run without passing `--profile`
+ENV_PROFILE = 'KFORCE_PROFILE'
+DEFAULT_REPORT_PATH = 'kforce-profile.json'
+SLOWEST_SPANS = 20  # spans listed in the `slowest` section of the report
+
+Span = namedtuple('Span', ('name', 'category', 'start', 'duration', 'thread', 'args'))
+
+_lock = threading.Lock()
+_enabled = False
+_started = None
+_spans = []
+
+
+def report_path(profile=False):
+    """where the report of a run goes, `profile` is `--profile` (`True` or a path); `None` if not profiling"""
+    profile = profile or os.environ.get(ENV_PROFILE)
+    if not profile:
+        return None
+    if profile is True or str(profile).lower() in ('1', 'true', 'yes'):
+        return DEFAULT_REPORT_PATH
+    return str(profile)
+
+
+def is_enabled():
+    return _enabled
+
+
+def start():
+    """start recording spans, returns `False` if already recording, i.e. the caller does not own this run"""
+    global _enabled, _started
+    with _lock:
+        if _enabled is True:
+            return False
+        del _spans[:]
+        _enabled, _started = True, time.time()
+        return True
+
+
+def stop():
+    global _enabled
+    with _lock:
+        _enabled = False
+        return list(_spans)
+
+
+def record(name, category, start, duration, **args):
+    if _enabled is False:
+        return
+    with _lock:
+        _spans.append(Span(name, category, start, duration, threading.current_thread().name, args))
+
+
+@contextmanager
+def span(name, category, **args):
+    if _enabled is False:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    except BaseException as e:
+        args['error'] = repr(e)
+        raise
+    finally:
+        record(name, category, start, time.time() - start, **args)
+
+
+def traced(f, name, category, **args):
+    """`f` with every call recorded as a span"""
+
+    @wraps(f)
+    def wrapper(*a, **kw):
+        with span(name, category, **args):
+            return f(*a, **kw)
+
+    return wrapper
+
+
+def _before_aws_call(model, context, **kwargs):
+    if _enabled is True:
+        context['kforce_trace_start'] = time.time()
+
+
+def _after_aws_call(model, context, **kwargs):
+    start = context.pop('kforce_trace_start', None)
+    if start is None:
+        return
+    args = dict(service=model.service_model.service_name)
+    if 'exception' in kwargs:
+        args['error'] = repr(kwargs['exception'])
+    record(model.name, 'aws', start, time.time() - start, **args)
+
+
+def instrument_client(client):
+    """record every api call of the boto3 `client` as a span while recording"""
+    client.meta.events.register('before-call', _before_aws_call)
+    client.meta.events.register('after-call', _after_aws_call)
+    client.meta.events.register('after-call-error', _after_aws_call)
+
+
+def build_report(spans):
+    spans = sorted(spans, key=lambda s: s.start)
+    origin = _started if _started is not None else min([s.start for s in spans] or [0])
+    totals = OrderedDict()
+    for s in spans:
+        total = totals.setdefault(s.category, dict(count=0, duration=0.0))
+        total['count'] += 1
+        total['duration'] += s.duration
+    clusters = OrderedDict()
+    for s in spans:
+        if s.category == 'command':
+            clusters[s.args.get('cluster')] = clusters.get(s.args.get('cluster'), 0.0) + s.duration
+
+    def as_dict(s):
+        return OrderedDict(
+            name=s.name,
+            category=s.category,
+            start=s.start - origin,
+            duration=s.duration,
+            thread=s.thread,
+            args=s.args
+        )
+
+    return OrderedDict(
+        duration=max([s.start + s.duration for s in spans] or [origin]) - origin,
+        totals=totals,
+        clusters=OrderedDict(sorted(clusters.items(), key=lambda i: -i[1])),
+        slowest=[as_dict(s) for s in sorted(spans, key=lambda s: -s.duration)[:SLOWEST_SPANS]],
+        spans=[as_dict(s) for s in spans],
+    )
+
+
+def build_chrome_trace(spans):
+    """spans in the trace event format, open it with `chrome://tracing` or https://ui.perfetto.dev"""
+    origin = min([s.start for s in spans] or [0])
+    threads = {}
+    events = []
+    for s in sorted(spans, key=lambda s: s.start):
+        tid = threads.setdefault(s.thread, len(threads) + 1)
+        events.append(
+            dict(
+                name=s.name,
+                cat=s.category,
+                ph='X',
+                ts=int((s.start - origin) * 1e6),
+                dur=int(s.duration * 1e6),
+                pid=1,
+                tid=tid,
+                args=s.args,
+            )
+        )
+    for thread, tid in threads.items():
+        events.append(dict(name='thread_name', ph='M', pid=1, tid=tid, args=dict(name=thread)))
+    return dict(traceEvents=events, displayTimeUnit='ms')
+
+
+def _dump(data, path):
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, default=str)
+
+
+def write_report(path, trace_path=None):
+    """stop recording, write the json report to `path` and the chrome trace to `trace_path` if given"""
+    spans = stop()
+    _dump(build_report(spans), path)
+    logger.info('profile report -> %s', path)
+    if trace_path:
+        _dump(build_chrome_trace(spans), trace_path)
+        logger.info('chrome trace -> %s', trace_path)
@@ -1,3 +1,8 @@
+import os
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 try:
     from colorama import Fore, Back, Style, init
     init()
@@ -21,3 +26,73 @@ def color_diff(diff):
             yield Fore.BLUE + line + Fore.RESET
         else:
             yield line
+
+
+def format_table(headers, rows):
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [max([len(h)] + [len(row[i]) for row in rows]) for i, h in enumerate(headers)]
+    lines = [headers] + rows
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in lines)
+
+
+def walk_files(paths):
+    """files under `paths` in the order go's `filepath.Walk` visits them, i.e. the order `kops` reads templates in"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for name in sorted(os.listdir(path)):
+            for f in walk_files([os.path.join(path, name)]):
+                yield f
+
+
+TaskResult = namedtuple('TaskResult', ('name', 'ok', 'skipped', 'duration', 'result', 'error'))
+
+
+def run_graph(tasks, dependencies, max_workers=4):
+    """
+    run `tasks` (`{name: callable}`) on a thread pool, each one as soon as all of its
+    `dependencies` (`{name: (name, ...)}`) succeeded; tasks depending on a failed one are skipped.
+
+    returns `{name: TaskResult}` in the order of `tasks`.
+    """
+    for name in tasks:
+        unknown = set(dependencies.get(name, ())) - set(tasks)
+        if unknown:
+            raise ValueError('`{}` depends on unknown -> {}'.format(name, sorted(unknown)))
+
+    results = {}
+    pending = OrderedDict((name, set(dependencies.get(name, ()))) for name in tasks)
+
+    def timed(name):
+        start = time.time()
+        try:
+            result = tasks[name]()
+        except Exception as e:
+            return TaskResult(name, False, False, time.time() - start, None, e)
+        return TaskResult(name, True, False, time.time() - start, result, None)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = set()
+        while pending or running:
+            scheduled = True
+            while scheduled:
+                scheduled = False
+                for name, deps in list(pending.items()):
+                    if any(d in results and not results[d].ok for d in deps):
+                        results[name] = TaskResult(name, False, True, 0.0, None, None)
+                    elif all(d in results for d in deps):
+                        running.add(executor.submit(timed, name))
+                    else:
+                        continue
+                    del pending[name]
+                    scheduled = True
+            if not running:
+                if pending:
+                    raise ValueError('dependency cycle between -> {}'.format(sorted(pending)))
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results[result.name] = result
+    return OrderedDict((name, results[name]) for name in tasks)
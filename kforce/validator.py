@@ -0,0 +1,165 @@
+"""
+in-process checks of the values files and the generated cluster spec, so mistakes surface in milliseconds instead of
+after a `kops` round trip
+"""
+import re
+import threading
+from collections import Counter
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # libyaml is not available
+    from yaml import SafeLoader
+
+SSH_PUBLIC_KEY_RE = re.compile(r'^(ssh-(rsa|dss|ed25519)|ecdsa-sha2-nistp\d+) [A-Za-z0-9+/]+={0,3}(\s.*)?$')
+VERSION_RE = re.compile(r'^v?(\d+)\.(\d+)')
+
+# `(kind, dotted path)` of the fields every document of `kind` must have, `[]` steps into every list item
+REQUIRED_FIELDS = (
+    ('Cluster', 'metadata.name'),
+    ('Cluster', 'spec.kubernetesVersion'),
+    ('Cluster', 'spec.subnets[].name'),
+    ('InstanceGroup', 'metadata.name'),
+    ('InstanceGroup', 'spec.role'),
+    ('InstanceGroup', 'spec.subnets[]'),
+)
+
+_lock = threading.Lock()
+_compiled = {}
+
+
+class ValidationError(ValueError):
+
+    def __init__(self, source, problems):
+        super().__init__('`{}` is not valid:\n\t{}'.format(source, '\n\t'.join(problems)))
+        self.source = source
+        self.problems = problems
+
+
+def compile_path(path):
+    """getter of the values at dotted `path` of a document, compiled once per process, e.g. `spec.subnets[].id`"""
+    with _lock:
+        if path not in _compiled:
+            _compiled[path] = _compile(path)
+        return _compiled[path]
+
+
+def _compile(path):
+    steps = [(part[:-2], True) if part.endswith('[]') else (part, False) for part in path.split('.')]
+
+    def get(doc):
+        values = [doc]
+        for key, each in steps:
+            values = [v[key] for v in values if isinstance(v, dict) and v.get(key) is not None]
+            if each:
+                values = [item for v in values if isinstance(v, list) for item in v]
+        return values
+
+    return get
+
+
+def _check_version(source, version, kops_version):
+    # kops supports the kubernetes release of the same `MAJOR.MINOR`
+    match, kops_match = VERSION_RE.match(str(version)), VERSION_RE.match(str(kops_version or ''))
+    if match is None:
+        return ['{}: kubernetes version `{}` is not `MAJOR.MINOR.PATCH`'.format(source, version)]
+    if kops_match is not None and match.groups() != kops_match.groups():
+        return ['{}: kubernetes {} needs kops {}.x, got kops {}'.format(source, version, match.group(0), kops_version)]
+    return []
+
+
+def check_values(values, kops_version=None):
+    """problems of the merged `values`, as `kops toolbox template` sees them"""
+    problems = []
+    public_key = values.get('publicKey')
+    if not public_key:
+        problems.append('`publicKey` is a required var')
+    elif not SSH_PUBLIC_KEY_RE.match(str(public_key).strip()):
+        problems.append('`publicKey` is not an ssh public key')
+    if values.get('kubernetesVersion'):
+        problems += _check_version('`kubernetesVersion`', values['kubernetesVersion'], kops_version)
+    return problems
+
+
+def check_spec(docs, vpc_facts=None, kops_version=None):
+    """problems of the generated cluster spec `docs`, subnets are checked against `vpc_facts` if given"""
+    problems = []
+    by_kind = {}
+    for doc in docs:
+        by_kind.setdefault(doc.get('kind'), []).append(doc)
+
+    for kind, path in REQUIRED_FIELDS:
+        get = compile_path(path)
+        for doc in by_kind.get(kind, ()):
+            if not get(doc):
+                problems.append('{}/{}: `{}` is required'.format(kind, (doc.get('metadata') or {}).get('name'), path))
+
+    clusters = by_kind.get('Cluster', [])
+    if len(clusters) != 1:
+        problems.append('exactly one `Cluster` expected, got {}'.format(len(clusters)))
+    names = Counter(name for ig in by_kind.get('InstanceGroup', ()) for name in compile_path('metadata.name')(ig))
+    for name, count in sorted(names.items()):
+        if count > 1:
+            problems.append('InstanceGroup/{}: defined {} times'.format(name, count))
+    if not clusters:
+        return problems
+    cluster = clusters[0]
+
+    for version in compile_path('spec.kubernetesVersion')(cluster):
+        problems += _check_version('Cluster', version, kops_version)
+
+    subnet_names = set(compile_path('spec.subnets[].name')(cluster))
+    for ig in by_kind.get('InstanceGroup', ()):
+        name = (ig.get('metadata') or {}).get('name')
+        for subnet in compile_path('spec.subnets[]')(ig):
+            if subnet not in subnet_names:
+                problems.append('InstanceGroup/{}: subnet `{}` is not a subnet of the cluster'.format(name, subnet))
+        spec = ig.get('spec') or {}
+        if spec.get('minSize') is not None and spec.get('maxSize') is not None and spec['minSize'] > spec['maxSize']:
+            problems.append('InstanceGroup/{}: minSize {} > maxSize {}'.format(name, spec['minSize'], spec['maxSize']))
+
+    if vpc_facts:
+        vpc = vpc_facts.get('vpc', {})
+        for network_id in compile_path('spec.networkID')(cluster):
+            if network_id != vpc.get('id'):
+                problems.append('Cluster: networkID `{}` is not vpc `{}`'.format(network_id, vpc.get('id')))
+        subnet_ids = set(vpc.get('public_subnets', ())) | set(vpc.get('private_subnets', ()))
+        nat_ids = {
+            v['private']['nat_id']
+            for v in vpc.values()
+            if isinstance(v, dict) and 'nat_id' in v.get('private', {})
+        }
+        for subnet_id in compile_path('spec.subnets[].id')(cluster):
+            if subnet_id not in subnet_ids:
+                problems.append('Cluster: subnet `{}` is not in vpc `{}`'.format(subnet_id, vpc.get('id')))
+        for egress in compile_path('spec.subnets[].egress')(cluster):
+            if str(egress).startswith('nat-') and egress not in nat_ids:
+                problems.append('Cluster: egress `{}` is not a nat gateway of vpc `{}`'.format(egress, vpc.get('id')))
+    return problems
+
+
+def load_values(paths):
+    """values files merged the way `kops toolbox template` merges them, the later file wins"""
+    values = {}
+    for path in paths:
+        with open(path) as f:
+            values.update(yaml.load(f, Loader=SafeLoader) or {})
+    return values
+
+
+def validate_values(paths, kops_version=None):
+    problems = check_values(load_values(paths), kops_version=kops_version)
+    if problems:
+        raise ValidationError(', '.join(paths), problems)
+
+
+def validate_spec(text, source='<string>', vpc_facts=None, kops_version=None):
+    try:
+        docs = [doc for doc in yaml.load_all(text, Loader=SafeLoader) if isinstance(doc, dict)]
+    except yaml.YAMLError as e:
+        raise ValidationError(source, ['not valid yaml -> {}'.format(e)])
+    problems = check_spec(docs, vpc_facts=vpc_facts, kops_version=kops_version)
+    if problems:
+        raise ValidationError(source, problems)
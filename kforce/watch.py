@@ -0,0 +1,56 @@
+import os
+import time
+
+
+def snapshot(paths):
+    """`{file path: (mtime, size)}` of every file under `paths`, missing paths are left out"""
+    files = {}
+    for path in paths:
+        if os.path.isfile(path):
+            candidates = [path]
+        else:
+            candidates = [os.path.join(d, f) for d, _, names in os.walk(path) for f in names]
+        for f in candidates:
+            try:
+                stat = os.stat(f)
+            except FileNotFoundError:
+                continue
+            files[f] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def _is_under(f, path):
+    return f == path or f.startswith(path.rstrip(os.sep) + os.sep)
+
+
+def watch_paths(paths_by_key, interval=1.0, iterations=None, cancel=None):
+    """
+    poll `{key: paths}` every `interval` seconds, yield `{key: changed files}` of the keys whose files were created,
+    modified or deleted since the previous poll.
+
+    `iterations` - polls before returning, forever by default,
+    `cancel` - a `threading.Event`, polling stops once it is set.
+    """
+    all_paths = sorted({p for paths in paths_by_key.values() for p in paths})
+    before = snapshot(all_paths)
+    polls = 0
+    while iterations is None or polls < iterations:
+        if cancel is not None:
+            if cancel.wait(interval):
+                return
+        else:
+            time.sleep(interval)
+        polls += 1
+
+        after = snapshot(all_paths)
+        changed = sorted(f for f in set(before) | set(after) if before.get(f) != after.get(f))
+        before = after
+        if not changed:
+            continue
+        affected = {
+            key: [f for f in changed if any(_is_under(f, p) for p in paths)]
+            for key, paths in paths_by_key.items()
+        }
+        affected = {key: files for key, files in affected.items() if files}
+        if affected:
+            yield affected
@@ -0,0 +1,73 @@
+import copy
+from collections import OrderedDict
+from difflib import unified_diff
+
+import yaml
+
+from .manifest import hash_data
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:  # libyaml is not available
+    from yaml import SafeLoader, SafeDumper
+
+# fields populated by kops / the api server, never part of the rendered templates
+SERVER_MANAGED_FIELDS = (
+    'metadata.creationTimestamp',
+    'metadata.generation',
+    'metadata.resourceVersion',
+    'metadata.uid',
+    'status',
+)
+
+
+def resource_key(doc):
+    metadata = doc.get('metadata') or {}
+    return '{}/{}'.format(doc.get('kind'), metadata.get('name'))
+
+
+def load_documents(text, source='<string>'):
+    """`{kind/name: document}` of every mapping document in `text`"""
+    docs = OrderedDict()
+    try:
+        for doc in yaml.load_all(text, Loader=SafeLoader):
+            if isinstance(doc, dict):
+                docs[resource_key(doc)] = doc
+    except yaml.YAMLError as e:
+        raise ValueError('`{}` is not valid yaml:\n{}'.format(source, e))
+    return docs
+
+
+def normalize(doc, ignore_fields=SERVER_MANAGED_FIELDS):
+    doc = copy.deepcopy(doc)
+    for field in ignore_fields:
+        *parents, leaf = field.split('.')
+        node = doc
+        for p in parents:
+            node = node.get(p) if isinstance(node, dict) else None
+        if isinstance(node, dict):
+            node.pop(leaf, None)
+    return doc
+
+
+def dump_document(doc):
+    if doc is None:
+        return []
+    return yaml.dump(doc, Dumper=SafeDumper, default_flow_style=False, sort_keys=True).splitlines()
+
+
+def diff_documents(current, desired, ignore_fields=SERVER_MANAGED_FIELDS):
+    """
+    yield `(kind/name, unified diff lines)` for every resource that differs between `current` and `desired`
+    (both `{kind/name: document}`), resources with the same normalized hash are skipped without being dumped.
+    """
+    for key in list(desired) + [k for k in current if k not in desired]:
+        a, b = current.get(key), desired.get(key)
+        a = None if a is None else normalize(a, ignore_fields)
+        b = None if b is None else normalize(b, ignore_fields)
+        if a is not None and b is not None and hash_data(a) == hash_data(b):
+            continue
+        lines = unified_diff(
+            dump_document(a), dump_document(b), fromfile='current_state/' + key, tofile='desired/' + key, lineterm=''
+        )
+        yield key, list(lines)
@@ -0,0 +1,74 @@
+"""
+offline benchmarks, stub `kops`/`kubectl` and moto backed AWS, no network needed.
+
+    KFORCE_BENCHMARK_SCALE=4 KFORCE_STUB_LATENCY=0.2 py.test tests/benchmark
+    python -m tests.benchmark.compare .benchmarks/<old commit>.json .benchmarks/<new commit>.json
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+from .stubs import ENV_LATENCY, ROOT
+
+ENV_SCALE = 'KFORCE_BENCHMARK_SCALE'
+ENV_OUTPUT = 'KFORCE_BENCHMARK_OUTPUT'
+
+SCALE = int(os.environ.get(ENV_SCALE, 1))  # small by default, so the benchmarks run with the rest of the suite
+
+RESULTS = OrderedDict()
+
+
+def measure(f, repeat=3):
+    """`(first run, best of the other runs)` in seconds, the first run pays for cold caches"""
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        f()
+        timings.append(time.time() - start)
+    return timings[0], min(timings[1:] or timings)
+
+
+def record(name, cold, warm=None, **params):
+    RESULTS[name] = OrderedDict(cold=cold, warm=cold if warm is None else warm, params=params)
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def write_results(path=None):
+    """dump `RESULTS` as json, to `.benchmarks/<commit>.json` unless `KFORCE_BENCHMARK_OUTPUT` says otherwise"""
+    if not RESULTS:
+        return None
+    commit = get_commit()
+    path = path or os.environ.get(ENV_OUTPUT) or os.path.join(ROOT, '.benchmarks', '%s.json' % commit)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    existing = {}
+    if os.path.isfile(path):
+        with open(path) as f:
+            existing = json.load(f).get('results', {})
+    existing.update(RESULTS)
+    with open(path, 'w') as f:
+        json.dump(
+            OrderedDict(
+                commit=commit,
+                created=time.time(),
+                python=sys.version.split()[0],
+                platform=platform.platform(),
+                scale=SCALE,
+                stub_latency=float(os.environ.get(ENV_LATENCY, 0)),
+                results=OrderedDict(sorted(existing.items())),
+            ),
+            f,
+            indent=2,
+        )
+    RESULTS.clear()
+    return path
@@ -0,0 +1,41 @@
+"""
+compare two benchmark result files, exits 1 if any benchmark regressed beyond the threshold
+
+    python -m tests.benchmark.compare old.json new.json [threshold, 1.2 by default]
+"""
+import json
+import sys
+
+from kforce.utils import format_table
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold=1.2):
+    """`(rows, regressed names)` comparing the warm timings of benchmarks in both `old` and `new`"""
+    rows, regressed = [], []
+    for name, result in sorted(new['results'].items()):
+        if name not in old['results']:
+            continue
+        before, after = old['results'][name]['warm'], result['warm']
+        ratio = after / before if before else float('inf')
+        flag = 'REGRESSED' if ratio > threshold else ''
+        if flag:
+            regressed.append(name)
+        rows.append((name, '%.4fs' % before, '%.4fs' % after, '%.2fx' % ratio, flag))
+    return rows, regressed
+
+
+def main(argv):
+    old, new = load(argv[0]), load(argv[1])
+    rows, regressed = compare(old, new, threshold=float(argv[2]) if len(argv) > 2 else 1.2)
+    print('%s -> %s' % (old['commit'][:8], new['commit'][:8]))
+    print(format_table(('BENCHMARK', 'OLD', 'NEW', 'RATIO', ''), rows))
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,106 @@
+"""
+stand-in `kops`/`kubectl` executables, so commands run end to end with no network.
+
+behaviour is tuned with env vars read by every stub invocation:
+    `KFORCE_STUB_LATENCY` - seconds each call sleeps before answering, 0 by default,
+    `KFORCE_STUB_IGS` - instance groups in the cluster spec printed by `kops toolbox template` / `kops get`.
+"""
+import os
+import stat
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENV_LATENCY = 'KFORCE_STUB_LATENCY'
+ENV_IGS = 'KFORCE_STUB_IGS'
+
+KOPS_VERSION = '1.8.1'
+
+SCRIPT = '''#!{python}
+import sys
+sys.path.insert(0, {root!r})
+from tests.benchmark.stubs import main
+main({name!r}, sys.argv[1:])
+'''
+
+
+def generate_spec(cluster_name, instance_groups, revision=0):
+    """kops cluster spec of `cluster_name` with `instance_groups` igs, `revision` changes every ig `maxSize`"""
+    subnet = '  - {cidr: 10.0.%s.0/24, name: subnet-%s, type: Private, zone: ap-southeast-2%s}'
+    docs = [
+        '\n'.join(
+            [
+                'apiVersion: kops/v1alpha2',
+                'kind: Cluster',
+                'metadata:',
+                '  name: %s' % cluster_name,
+                'spec:',
+                '  kubernetesVersion: 1.8.8',
+                '  channel: stable',
+                '  subnets:',
+            ] + [subnet % (i, i, 'abc'[i % 3]) for i in range(min(instance_groups, 200))]
+        )
+    ]
+    for i in range(instance_groups):
+        docs.append(
+            '\n'.join(
+                [
+                    'apiVersion: kops/v1alpha2',
+                    'kind: InstanceGroup',
+                    'metadata:',
+                    '  labels:',
+                    '    kops.k8s.io/cluster: %s' % cluster_name,
+                    '  name: nodes-%s' % i,
+                    'spec:',
+                    '  image: kope.io/k8s-1.8-debian-jessie-amd64-hvm-ebs-2018-01-14',
+                    '  machineType: t2.large',
+                    '  maxSize: %s' % (3 + revision),
+                    '  minSize: 1',
+                    '  nodeLabels:',
+                    '    kops.k8s.io/instancegroup: nodes-%s' % i,
+                    '  role: Node',
+                    '  subnets:',
+                    '  - subnet-%s' % (i % 200),
+                ]
+            )
+        )
+    return '\n---\n\n'.join(docs)
+
+
+def make_stub_bins(bin_dir):
+    """write the stubs into `bin_dir`, put it first on `PATH` to use them"""
+    os.makedirs(bin_dir, exist_ok=True)
+    for name in ('kops', 'kubectl'):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write(SCRIPT.format(python=sys.executable, root=ROOT, name=name))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _flag(args, name):
+    for arg in args:
+        if arg.startswith('--%s=' % name):
+            return arg.split('=', 1)[1]
+
+
+def kops(args):
+    sub_cmds = [a for a in args if not a.startswith('-')]
+    cluster_name = _flag(args, 'name') or 'cluster.k8s.local'
+    if sub_cmds[:1] == ['version']:
+        return 'Version %s (git-xxxx)' % KOPS_VERSION
+    if sub_cmds[:2] == ['toolbox', 'template'] or sub_cmds[:1] == ['get'] and 'secret' not in sub_cmds:
+        return generate_spec(cluster_name, int(os.environ.get(ENV_IGS, 1)))
+    if sub_cmds[:2] == ['get', 'secret']:
+        return 'SSHPublicKey\tadmin\txxxx'
+    return ''
+
+
+def kubectl(args):
+    files = [args[i + 1] for i, a in enumerate(args) if a == '-f']
+    return '\n'.join('%s configured' % os.path.basename(f) for f in files)
+
+
+def main(name, args):
+    time.sleep(float(os.environ.get(ENV_LATENCY, 0)))
+    print(dict(kops=kops, kubectl=kubectl)[name](args))
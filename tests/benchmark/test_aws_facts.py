@@ -0,0 +1,67 @@
+import os
+from unittest import TestCase
+
+import boto3
+from kforce import aws_clients
+from kforce.aws_facts import get_vpc_facts
+from moto import mock_ec2
+
+from . import SCALE, measure, record, write_results
+
+REGION = 'ap-southeast-2'
+AZS = ('a', 'b', 'c')
+# subnets of the synthetic vpcs, a /16 vpc fits 256 /24 subnets
+VPC_SIZES = sorted({min(size * SCALE, 250) for size in (10, 50)})
+
+
+def create_vpc(ec2, subnets, cidr_prefix='10.0'):
+    """vpc with `subnets` subnets spread across all azs, half of them public, returns its id"""
+    vpc_id = ec2.create_vpc(CidrBlock='%s.0.0/16' % cidr_prefix)['Vpc']['VpcId']
+    igw_id = ec2.create_internet_gateway()['InternetGateway']['InternetGatewayId']
+    ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+
+    def create_subnet(index):
+        return ec2.create_subnet(
+            VpcId=vpc_id, CidrBlock='%s.%s.0/24' % (cidr_prefix, index), AvailabilityZone=REGION + AZS[index % 3]
+        )['Subnet']['SubnetId']
+
+    def create_route_table(**target):
+        rt_id = ec2.create_route_table(VpcId=vpc_id)['RouteTable']['RouteTableId']
+        ec2.create_route(RouteTableId=rt_id, DestinationCidrBlock='0.0.0.0/0', **target)
+        return rt_id
+
+    public_rt_id = create_route_table(GatewayId=igw_id)
+    nat_subnet_id = create_subnet(0)
+    ec2.associate_route_table(RouteTableId=public_rt_id, SubnetId=nat_subnet_id)
+    allocation_id = ec2.allocate_address(Domain='vpc')['AllocationId']
+    nat_id = ec2.create_nat_gateway(SubnetId=nat_subnet_id, AllocationId=allocation_id)['NatGateway']['NatGatewayId']
+    private_rt_id = create_route_table(NatGatewayId=nat_id)
+    for i in range(1, subnets):
+        ec2.associate_route_table(RouteTableId=public_rt_id if i % 2 else private_rt_id, SubnetId=create_subnet(i))
+    return vpc_id
+
+
+def tearDownModule():
+    write_results()
+
+
+@mock_ec2
+class TestAwsFactsBenchmark(TestCase):
+
+    def setUp(self):
+        os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        aws_clients.reset()
+        self.ec2 = boto3.client('ec2', region_name=REGION)
+
+    def test_get_vpc_facts(self):
+        for i, size in enumerate(VPC_SIZES):
+            vpc_id = create_vpc(self.ec2, size, cidr_prefix='10.%s' % i)
+            facts = {}
+
+            def gather():
+                facts.update(get_vpc_facts(vpc_id, region=REGION))
+
+            cold, warm = measure(gather)
+            record('aws_facts.get_vpc_facts[subnets=%s]' % size, cold, warm, subnets=size)
+            assert len(facts['vpc']['public_subnets']) + len(facts['vpc']['private_subnets']) == size
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import boto3
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from kforce import aws_clients, commands, pre_steps
+from mock import patch
+from moto import mock_ec2, mock_s3
+
+from . import SCALE, measure, record, write_results
+from .stubs import ENV_IGS, make_stub_bins
+from .test_aws_facts import REGION, create_vpc
+
+INSTANCE_GROUPS = 5 * SCALE
+ADDONS = 5 * SCALE
+COMMANDS = (
+    (commands.New, dict()),
+    (commands.Build, dict(force=True)),
+    (commands.Build, dict()),  # incremental, nothing changed
+    (commands.Diff, dict()),
+    (commands.Diff, dict(semantic=True)),
+    (commands.Apply, dict()),
+    (commands.Install, dict()),
+)
+
+
+def tearDownModule():
+    write_results()
+
+
+def make_public_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.public_key().public_bytes(serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH).decode()
+
+
+@mock_ec2
+@mock_s3
+class TestCommandsBenchmark(TestCase):
+    """every command end to end against stub `kops`/`kubectl` and moto, in the order they are used"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        bin_dir = os.path.join(self.root, 'bin')
+        make_stub_bins(bin_dir)
+
+        self.patchers = [
+            patch.dict(
+                os.environ, {
+                    'PATH': bin_dir + os.pathsep + os.environ.get('PATH', ''),
+                    'AWS_ACCESS_KEY_ID': 'testing',
+                    'AWS_SECRET_ACCESS_KEY': 'testing',
+                    ENV_IGS: str(INSTANCE_GROUPS),
+                }
+            ),
+            patch.dict(pre_steps._kops_versions, clear=True),
+        ]
+        for p in self.patchers:
+            p.start()
+        aws_clients.reset()
+
+        self.vpc_id = create_vpc(boto3.client('ec2', region_name=REGION), 10)
+        for d in ('templates/addons', 'vars/acc1'):
+            os.makedirs(os.path.join(self.root, d))
+        open(os.path.join(self.root, 'templates', 'cluster.yaml'), 'w').close()
+
+    def tearDown(self):
+        for p in reversed(self.patchers):
+            p.stop()
+        aws_clients.reset()
+        shutil.rmtree(self.root)
+
+    def make_command(self, klass):
+        klass = type(
+            klass.__name__, (klass, ),
+            dict(
+                DIR_ROOT=self.root,
+                DIR_TEMPLATE=os.path.join(self.root, 'templates'),
+                DIR_ADDON=os.path.join(self.root, 'templates', 'addons'),
+                DIR_CACHE=os.path.join(self.root, '.kforce_cache'),
+            )
+        )
+        return klass(env='s', account_name='acc1', vpc_id=self.vpc_id, region=REGION)
+
+    def prepare(self, klass):
+        """what a user does by hand between commands"""
+        if klass is commands.Build:
+            with open(os.path.join(self.root, 'vars', 'acc1', 's.yaml'), 'w') as f:
+                f.write('publicKey: %s\n' % make_public_key())
+        if klass is commands.Install:
+            for i in range(ADDONS):
+                with open(os.path.join(self.root, 'templates', 'addons', 'addon-%s.yaml' % i), 'w') as f:
+                    f.write('# kforce.io/depends-on: addon-0.yaml\n' if i else '')
+                    f.write('kind: ConfigMap\nmetadata:\n  name: addon-%s\n' % i)
+
+    def test_end_to_end(self):
+        for klass, kwargs in COMMANDS:
+            self.prepare(klass)
+            cmd = self.make_command(klass)
+            cold, warm = measure(lambda: cmd._run(**kwargs))
+            name = 'commands.%s[%s]' % (
+                klass.get_name(), ','.join('%s=%s' % i for i in sorted(kwargs.items())) or 'default'
+            )
+            record(name, cold, warm, instance_groups=INSTANCE_GROUPS, addons=ADDONS)
+
+        with open(os.path.join(self.root, '__generated__', 's-acc1.yaml')) as f:
+            assert f.read().count('kind: InstanceGroup') == INSTANCE_GROUPS
@@ -0,0 +1,42 @@
+from difflib import unified_diff
+from unittest import TestCase
+
+from kforce.yaml_diff import diff_documents, load_documents
+
+from . import SCALE, measure, record, write_results
+from .stubs import generate_spec
+
+CLUSTER_NAME = 's-acc1.k8s.local'
+SPEC_SIZES = (10 * SCALE, 100 * SCALE)  # instance groups per spec
+
+
+def tearDownModule():
+    write_results()
+
+
+class TestDiffBenchmark(TestCase):
+
+    def test_semantic_diff(self):
+        for size in SPEC_SIZES:
+            current, desired = generate_spec(CLUSTER_NAME, size), generate_spec(CLUSTER_NAME, size, revision=1)
+            for name, text in (('unchanged', current), ('changed', desired)):
+                changes = []
+
+                def diff():
+                    changes[:] = list(diff_documents(load_documents(current), load_documents(text)))
+
+                cold, warm = measure(diff)
+                record('yaml_diff.semantic[igs=%s,%s]' % (size, name), cold, warm, instance_groups=size)
+                assert len(changes) == (0 if name == 'unchanged' else size)
+
+    def test_line_diff(self):
+        for size in SPEC_SIZES:
+            current, desired = generate_spec(CLUSTER_NAME, size), generate_spec(CLUSTER_NAME, size, revision=1)
+            lines = []
+
+            def diff():
+                lines[:] = list(unified_diff(current.splitlines(), desired.splitlines()))
+
+            cold, warm = measure(diff)
+            record('yaml_diff.line[igs=%s]' % size, cold, warm, instance_groups=size)
+            assert lines
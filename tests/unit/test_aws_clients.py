@@ -0,0 +1,34 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from kforce import aws_clients
+
+
+class TestAwsClients(TestCase):
+
+    def setUp(self):
+        os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        aws_clients.reset()
+
+    def tearDown(self):
+        aws_clients.reset()
+
+    def test_shared_per_region(self):
+        ec2 = aws_clients.get_client('ec2', region='ap-southeast-2')
+        assert aws_clients.get_client('ec2', region='ap-southeast-2') is ec2
+        assert aws_clients.get_client('ec2', region='us-east-1') is not ec2
+        assert aws_clients.get_client('s3', region='ap-southeast-2') is not ec2
+        assert ec2.meta.region_name == 'ap-southeast-2'
+
+    def test_config(self):
+        config = aws_clients.get_client('ec2', region='ap-southeast-2').meta.config
+        assert config.max_pool_connections == aws_clients.MAX_POOL_CONNECTIONS
+        assert config.retries['mode'] == 'adaptive'
+
+    def test_concurrent_callers(self):
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            clients = list(executor.map(lambda _: aws_clients.get_client('s3', region='ap-southeast-2'), range(64)))
+        assert len({id(c) for c in clients}) == 1
+        assert len(aws_clients._sessions) == 1
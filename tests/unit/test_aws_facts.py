@@ -1,15 +1,106 @@
+import json
 import os
 from unittest import TestCase
 
-from kforce.aws_facts import get_vpc_facts
+import boto3
+from botocore.client import BaseClient
+from kforce import aws_clients
+from kforce.aws_facts import check_rt_internet_facing, get_vpc_facts, get_vpc_facts_from_snapshot, snapshot_region
+from mock import patch
 from moto import mock_ec2
 
+REGION = 'ap-southeast-2'
+AZS = ('a', 'b', 'c')
+
 
 @mock_ec2
 class TestAwsFacts(TestCase):
 
     def setUp(self):
-        ...
+        os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        aws_clients.reset()
+        self.ec2 = boto3.client('ec2', region_name=REGION)
+
+        self.vpc_id = self.ec2.create_vpc(CidrBlock='10.0.0.0/16')['Vpc']['VpcId']
+        igw_id = self.ec2.create_internet_gateway()['InternetGateway']['InternetGatewayId']
+        self.ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=self.vpc_id)
+
+        self.public_rt_id = self.__create_route_table(GatewayId=igw_id)
+        nat_subnet_id = self.__create_subnet(0, 'a')
+        self.ec2.associate_route_table(RouteTableId=self.public_rt_id, SubnetId=nat_subnet_id)
+        allocation_id = self.ec2.allocate_address(Domain='vpc')['AllocationId']
+        nat_gateway = self.ec2.create_nat_gateway(SubnetId=nat_subnet_id, AllocationId=allocation_id)['NatGateway']
+        self.nat_id = nat_gateway['NatGatewayId']
+        self.private_rt_id = self.__create_route_table(NatGatewayId=self.nat_id)
+
+        # synthetic vpc with plenty of subnets spread across all azs
+        self.subnet_count = 60
+        for i in range(1, self.subnet_count):
+            rt_id = self.public_rt_id if i % 2 else self.private_rt_id
+            subnet_id = self.__create_subnet(i, AZS[i % len(AZS)])
+            self.ec2.associate_route_table(RouteTableId=rt_id, SubnetId=subnet_id)
+
+    def __create_subnet(self, index, az):
+        return self.ec2.create_subnet(
+            VpcId=self.vpc_id, CidrBlock='10.0.%s.0/24' % index, AvailabilityZone=REGION + az
+        )['Subnet']['SubnetId']
+
+    def __create_route_table(self, **target):
+        rt_id = self.ec2.create_route_table(VpcId=self.vpc_id)['RouteTable']['RouteTableId']
+        self.ec2.create_route(RouteTableId=rt_id, DestinationCidrBlock='0.0.0.0/0', **target)
+        return rt_id
 
     def test_check_rt_internet_facing(self):
-        ...
+        public_rt = dict(Routes=[dict(State='active', GatewayId='igw-xxxx')])
+        private_rt = dict(Routes=[dict(State='active', GatewayId='local'), dict(State='active', NatGatewayId='nat-x')])
+        blackhole_rt = dict(Routes=[dict(State='blackhole', NatGatewayId='nat-x')])
+
+        assert check_rt_internet_facing('public', public_rt) == (True, None)
+        assert check_rt_internet_facing('private', public_rt) == (False, None)
+        assert check_rt_internet_facing('public', private_rt) == (False, 'nat-x')
+        assert check_rt_internet_facing('private', private_rt) == (True, 'nat-x')
+        assert check_rt_internet_facing('private', blackhole_rt) == (False, None)
+
+    def test_get_vpc_facts(self):
+        facts = get_vpc_facts(self.vpc_id, region=REGION)
+
+        assert sorted(facts['azs']) == [REGION + az for az in AZS]
+        vpc = facts['vpc']
+        assert vpc['id'] == self.vpc_id
+        assert vpc['cidr'] == '10.0.0.0/16'
+        assert len(vpc['public_subnets']) + len(vpc['private_subnets']) == self.subnet_count
+        for az in AZS:
+            assert vpc['subnet-public-%s%s' % (REGION, az)][0] in vpc['public_subnets']
+            assert vpc['subnet-private-%s%s' % (REGION, az)] == [vpc[az]['private']['id']]
+            assert vpc[az]['private']['nat_id'] == self.nat_id
+            assert 'nat_id' not in vpc[az]['public']
+
+    def test_get_vpc_facts_api_calls(self):
+        make_api_call = BaseClient._make_api_call
+        calls = []
+
+        def counting_make_api_call(client, operation_name, api_params):
+            calls.append(operation_name)
+            return make_api_call(client, operation_name, api_params)
+
+        with patch.object(BaseClient, '_make_api_call', autospec=True, side_effect=counting_make_api_call):
+            get_vpc_facts(self.vpc_id, region=REGION)
+
+        # fixed number of calls no matter how many subnets and route tables the vpc has
+        assert sorted(calls) == ['DescribeRouteTables', 'DescribeSubnets', 'DescribeVpcs']
+
+    def test_snapshot_region(self):
+        other_vpc_id = self.ec2.create_vpc(CidrBlock='10.1.0.0/16')['Vpc']['VpcId']
+        snapshot = json.loads(json.dumps(snapshot_region(region=REGION)))  # shared between processes as plain data
+
+        assert {self.vpc_id, other_vpc_id} <= set(snapshot['vpcs'])
+        facts, expected = get_vpc_facts_from_snapshot(snapshot, self.vpc_id), get_vpc_facts(self.vpc_id, region=REGION)
+        assert sorted(facts['azs']) == sorted(expected['azs'])
+        for key in ('public_subnets', 'private_subnets'):
+            assert sorted(facts['vpc'][key]) == sorted(expected['vpc'][key])
+        for az in AZS:
+            assert facts['vpc'][az] == expected['vpc'][az]
+        assert get_vpc_facts_from_snapshot(snapshot, other_vpc_id)['vpc']['public_subnets'] == []
+        with self.assertRaises(KeyError):
+            get_vpc_facts_from_snapshot(snapshot, 'vpc-missing')
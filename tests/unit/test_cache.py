@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import pytest
+from kforce.cache import CacheModule
+
+
+class TestCacheModule(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = CacheModule(os.path.join(self.cache_dir, 'nested'), timeout=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_get_set(self):
+        with pytest.raises(KeyError):
+            self.cache.get('k1')
+        assert self.cache.contains('k1') is False
+
+        self.cache.set('k1', dict(a=[1, 2]))
+        assert self.cache.get('k1') == dict(a=[1, 2])
+        assert self.cache.contains('k1') is True
+        assert self.cache.keys() == ['k1']
+
+    def test_expired(self):
+        self.cache.set('k1', 'v1')
+        past = time.time() - 120
+        os.utime(os.path.join(self.cache_dir, 'nested', 'k1'), (past, past))
+        assert self.cache.contains('k1') is False
+        with pytest.raises(KeyError):
+            self.cache.get('k1')
+
+        # never expire
+        assert CacheModule(os.path.join(self.cache_dir, 'nested')).get('k1') == 'v1'
+
+    def test_delete_flush(self):
+        self.cache.set('k1', 'v1')
+        self.cache.set('k2', 'v2')
+        self.cache.delete('k1')
+        self.cache.delete('not-there')
+        assert self.cache.keys() == ['k2']
+        self.cache.flush()
+        assert self.cache.keys() == []
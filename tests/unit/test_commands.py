@@ -1,12 +1,19 @@
+import json
 import logging
 import os
+import shutil
+import tempfile
+import time
 from importlib import import_module
+from io import StringIO
 from unittest import TestCase
 from unittest.mock import MagicMock, create_autospec
 
 import mockfs
 import pytest
-from kforce import commands
+from kforce import commands, pre_steps, shell
+from kforce.cache import CacheModule
+from kforce.utils import walk_files
 from mock import patch
 
 logger = logging.getLogger(__name__)
@@ -25,6 +32,10 @@ class TestCommands(TestCase):
             'diff',
             'apply',
             'install',
+            'watch',
+            'plan',
+            'up',
+            'status',
         ]
         module = import_module('kforce.commands')
         for c_name in cmds:
@@ -78,3 +89,661 @@ class TestCommand(BaseCommandClient):
         getattr(c, 'run').assert_called_once()
         for i in ensure_func_names:
             getattr(c, i).assert_called_once()
+
+    def test_pre_steps_declared(self):
+        for klass in (
+            commands.Command, commands.New, commands.Build, commands.Diff, commands.Apply, commands.Install,
+            commands.Watch, commands.Plan, commands.Up, commands.Status
+        ):
+            ensure_func_names = {i for i in dir(klass) if i.startswith('ensure') and callable(getattr(klass, i))}
+            assert ensure_func_names == set(klass.PRE_STEPS), klass
+            for deps in klass.PRE_STEPS.values():
+                assert set(deps) <= ensure_func_names
+
+    def test_pre_run_order_and_failure(self):
+        c = commands.Build(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        called = []
+
+        def step(name, error=None):
+
+            def f():
+                if name == 'ensure_aws_facts':
+                    assert 'ensure_region' in called
+                called.append(name)
+                if error is not None:
+                    raise error
+
+            return f
+
+        for name in c.PRE_STEPS:
+            setattr(c, name, step(name))
+        setattr(c, 'ensure_dir_and_files', step('ensure_dir_and_files', IOError('missing')))
+        setattr(c, 'ensure_workspace', step('ensure_workspace', RuntimeError('no space')))
+        c.run = lambda: called.append('run')
+
+        with pytest.raises(RuntimeError):
+            c._run()
+        # all independent steps ran, the first failure in declared order is raised
+        assert sorted(called) == sorted(c.PRE_STEPS)
+
+    def test_pre_run_timings_logged(self):
+        c = commands.Command(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        for name in c.PRE_STEPS:
+            setattr(c, name, lambda: time.sleep(0.05))
+        c.run = lambda: None
+
+        with self.assertLogs('kforce.commands', level='INFO') as logs:
+            c._run()
+        timings = [line for line in logs.output if '__pre_run: ' in line][0].split('__pre_run: ')[1]
+        for timing in timings.split(', '):
+            name, duration = timing.split(' ')
+            assert name in c.PRE_STEPS
+            assert float(duration.rstrip('s')) >= 0.05
+
+
+def make_instance_group(name):
+    return 'kind: InstanceGroup\nmetadata:\n  name: %s\nspec:\n  role: Node\n  subnets: [ap-southeast-2a]\n' % name
+
+
+def kops_template(args):
+    """lines `kops toolbox template` prints for `args`: every template file as is, `---` in between"""
+    templates = [t for i, t in enumerate(args.split()) if args.split()[i - 1] == '--template']
+    rendered = []
+    for f in walk_files(templates):
+        with open(f) as fp:
+            rendered.append('apiVersion: kops/v1alpha2\n' + fp.read())
+    return iter(('W0101 some warning\n' + '---\n'.join(rendered)).splitlines())
+
+
+def make_repo_class(klass, root, **attrs):
+    attrs.update(
+        DIR_ROOT=root,
+        DIR_TEMPLATE=os.path.join(root, 'templates'),
+        DIR_ADDON=os.path.join(root, 'templates', 'addons'),
+        DIR_CACHE=os.path.join(root, '.kforce_cache'),
+    )
+    return type(klass.__name__, (klass, ), attrs)
+
+
+def make_repo(root):
+    """a minimal kforce repo at `root`, with templates and vars for cluster `s-acc1`"""
+    for d in ('templates/addons', 'templates/snippets', 'vars/acc1/s-ig', '__generated__'):
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+    for f, content in (
+        (
+            'templates/cluster.yaml', 'kind: Cluster\nmetadata:\n  name: s-acc1.k8s.local\nspec:\n'
+            '  kubernetesVersion: 1.8.8\n  subnets:\n  - {name: ap-southeast-2a}\n'
+        ),
+        ('templates/values.yaml.j2', 'kubernetesVersion: 1.8.8\n{{vpc_facts}}\n'),
+        ('vars/acc1/s.yaml', 'publicKey: ssh-rsa xxxx\n'),
+        ('vars/acc1/s-ig/nodes.yaml', make_instance_group('nodes')),
+    ):
+        if not os.path.isfile(os.path.join(root, f)):
+            with open(os.path.join(root, f), 'w') as fp:
+                fp.write(content)
+
+
+class RepoCommandClient(TestCase):
+
+    def setUp(self, klass, **children):
+        """`self.c` a `klass` rooted at `self.root`, `children` - child commands rooted there too, by class attr"""
+        self.root = tempfile.mkdtemp()
+        make_repo(self.root)
+        attrs = {name: make_repo_class(child, self.root) for name, child in children.items()}
+        self.c = make_repo_class(klass, self.root, **attrs)(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        self.patchers = []
+
+    def start_patchers(self, *patchers):
+        self.patchers.extend(patchers)
+        return [p.start() for p in patchers]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        if self.c.dir_tmp is not None:
+            shutil.rmtree(self.c.dir_tmp, ignore_errors=True)
+        shutil.rmtree(self.root)
+
+
+class TestBuild(RepoCommandClient):
+
+    def setUp(self):
+        super().setUp(commands.Build)
+        self.c.vpc_facts = dict(azs=['ap-southeast-2a'], vpc=dict(id='vpc-xxxx'))
+        self.c.ensure_workspace()
+        self.kops_calls = []
+
+        def kops_cmd(args, stream=False):
+            self.kops_calls.append(args)
+            if args == 'version':
+                return 'Version 1.8.1'
+            return kops_template(args)
+
+        self.c._kops_cmd = kops_cmd
+
+    def __toolbox_calls(self):
+        return [c for c in self.kops_calls if c.startswith('toolbox')]
+
+    @patch.dict('kforce.pre_steps._kops_versions', clear=True)
+    @patch('shutil.which', side_effect=lambda bin: __file__)
+    def test_kops_failure_mid_stream(self, which):
+
+        def lines():
+            yield 'apiVersion: kops/v1alpha2'
+            raise RuntimeError('kops exited with 1')
+
+        self.c._kops_cmd = lambda args, stream=False: 'Version 1.8.1' if args == 'version' else lines()
+        with pytest.raises(RuntimeError):
+            self.c.run()
+        assert os.listdir(os.path.dirname(self.c.template_rendered_path)) == []
+
+    @patch.dict('kforce.pre_steps._kops_versions', clear=True)
+    @patch('shutil.which', side_effect=lambda bin: __file__)
+    def test_invalid_values(self, which):
+        with open(self.c.current_value_file_path, 'w') as f:
+            f.write('publicKey: ~/.ssh/id_rsa.pub\n')
+        with pytest.raises(ValueError) as e:
+            self.c.run()
+        assert '`publicKey` is not an ssh public key' in str(e.value)
+        assert self.__toolbox_calls() == []  # before any template rendered by kops
+
+    @patch.dict('kforce.pre_steps._kops_versions', clear=True)
+    @patch('shutil.which', side_effect=lambda bin: __file__)
+    def test_invalid_spec(self, which):
+        with open(os.path.join(self.root, 'vars/acc1/s-ig/nodes-copy.yaml'), 'w') as f:
+            f.write(make_instance_group('nodes'))
+        with pytest.raises(ValueError) as e:
+            self.c.run()
+        assert 'InstanceGroup/nodes: defined 2 times' in str(e.value)
+        assert os.path.isfile(self.c.template_rendered_path)  # left for inspection
+        with pytest.raises(ValueError):
+            self.c.run()  # rendered again, not taken as up to date
+        assert len(self.__toolbox_calls()) == 2
+
+    @patch.dict('kforce.pre_steps._kops_versions', clear=True)
+    @patch('shutil.which', side_effect=lambda bin: __file__)
+    def test_incremental(self, which):
+        self.c.run()
+        with open(self.c.template_rendered_path) as f:
+            assert f.read().startswith('---\n\napiVersion: kops/v1alpha2\nkind: Cluster\n')
+        assert len(self.__toolbox_calls()) == 1
+
+        # nothing changed
+        self.c.run()
+        assert len(self.__toolbox_calls()) == 1
+
+        # an input changed
+        with open(os.path.join(self.root, 'vars/acc1/s-ig/nodes.yaml'), 'a') as f:
+            f.write('  maxSize: 3\n')
+        self.c.run()
+        assert len(self.__toolbox_calls()) == 2
+
+        # facts changed
+        self.c.vpc_facts['azs'].append('ap-southeast-2b')
+        self.c.run()
+        assert len(self.__toolbox_calls()) == 3
+
+        # generated file edited by hand
+        with open(self.c.template_rendered_path, 'a') as f:
+            f.write('\n# edited')
+        self.c.run()
+        assert len(self.__toolbox_calls()) == 4
+
+        self.c.run(force=True)
+        assert len(self.__toolbox_calls()) == 5
+
+    @patch('shutil.which', side_effect=lambda bin: __file__)
+    def test_per_ig(self, which):
+        ig_dir = os.path.join(self.root, 'vars/acc1/s-ig')
+        for i in range(12):
+            with open(os.path.join(ig_dir, 'ig-%02d.yaml' % i), 'w') as f:
+                f.write(make_instance_group('ig-%s' % i))
+        os.makedirs(os.path.join(ig_dir, 'extra'))
+        with open(os.path.join(ig_dir, 'extra', 'spot.yaml'), 'w') as f:
+            f.write(make_instance_group('spot'))
+
+        with patch.dict('kforce.pre_steps._kops_versions', clear=True):
+            self.c.run()
+            with open(self.c.template_rendered_path) as f:
+                expected = f.read()
+            assert expected.count('apiVersion') == 15  # cluster.yaml, nodes.yaml, extra/spot.yaml, 12 igs
+
+            self.c.run(force=True, per_ig=True)
+            assert len(self.__toolbox_calls()) == 1 + 15
+            with open(self.c.template_rendered_path) as f:
+                assert f.read() == expected
+
+            # only the changed ig is rendered again
+            with open(os.path.join(ig_dir, 'ig-03.yaml'), 'a') as f:
+                f.write('  maxSize: 3\n')
+            self.c.run(per_ig=True)
+            assert len(self.__toolbox_calls()) == 1 + 15 + 1
+            with open(self.c.template_rendered_path) as f:
+                per_ig = f.read()
+            self.c.run(force=True)
+            with open(self.c.template_rendered_path) as f:
+                assert f.read() == per_ig
+
+            # values affect every template
+            self.c.vpc_facts['azs'].append('ap-southeast-2b')
+            self.c.run(per_ig=True)
+            assert len(self.__toolbox_calls()) == 1 + 15 + 1 + 1 + 15
+            fragments = os.path.join(self.c.DIR_CACHE, '.fragments', self.c.cluster_name)
+            assert len(os.listdir(fragments)) == 15  # outdated fragments pruned
+
+
+class TestInstall(RepoCommandClient):
+
+    def setUp(self):
+        super().setUp(commands.Install)
+        self.c.ensure_workspace()
+        for addon, content in (
+            ('namespaces.yaml', 'kind: Namespace'),
+            ('crds.yaml', 'kind: CustomResourceDefinition'),
+            ('ingress.yaml', '# kforce.io/depends-on: namespaces.yaml, crds.yaml\nkind: Deployment'),
+            ('dashboard.yaml', '# kforce.io/depends-on: namespaces.yaml\nkind: Deployment'),
+            ('README.md', 'not an addon'),
+        ):
+            with open(os.path.join(self.c.DIR_ADDON, addon), 'w') as f:
+                f.write(content)
+        self.applied = []
+
+    def sh(self, args, **kwargs):
+        assert args[1] == '--context=s-acc1.k8s.local'
+        files = [os.path.basename(a) for a in args[args.index('-f') + 1::2]]
+        if self.broken in files:
+            raise RuntimeError('boom')
+        self.applied.append((' '.join(args[2:args.index('-f')]), files))
+
+    def install(self, **kwargs):
+        self.c._sh = self.sh
+        with patch('shutil.which', return_value='/usr/bin/kubectl'):
+            self.c.run(**kwargs)
+
+    def test_run(self):
+        self.broken = None
+        with self.assertLogs(self.c.logger.logger, 'WARNING') as logs:
+            self.install(workers=2)
+        assert len(logs.output) == 1 and 'skipping `README.md`' in logs.output[0]
+
+        # one bundle per level of dependencies
+        assert self.applied == [
+            ('apply', ['crds.yaml', 'namespaces.yaml']),
+            ('apply', ['dashboard.yaml', 'ingress.yaml']),
+        ]
+
+    def test_unchanged_skipped(self):
+        self.broken = None
+        self.install()
+        self.applied = []
+        self.install()
+        assert self.applied == []
+
+        with open(os.path.join(self.c.DIR_ADDON, 'namespaces.yaml'), 'a') as f:
+            f.write('\nmetadata: {name: kube-system}')
+        self.install(server_side=True)
+        # dependents are unchanged
+        assert self.applied == [('apply --server-side --field-manager=kforce', ['namespaces.yaml'])]
+
+        self.applied = []
+        self.install(force=True)
+        assert len(self.applied) == 2
+
+    def test_failure_does_not_abort_independent_addons(self):
+        self.broken = 'crds.yaml'
+        with pytest.raises(RuntimeError) as e:
+            self.install()
+        assert 'crds.yaml' in str(e.value) and 'ingress.yaml' in str(e.value)
+        # the failed bundle retried addon by addon
+        assert self.applied == [('apply', ['namespaces.yaml']), ('apply', ['dashboard.yaml'])]
+
+        self.broken, self.applied = None, []
+        self.install()
+        assert self.applied == [('apply', ['crds.yaml']), ('apply', ['ingress.yaml'])]
+
+    def test_prune(self):
+        self.broken = None
+        self.install()
+        os.remove(os.path.join(self.c.DIR_ADDON, 'dashboard.yaml'))
+        os.remove(os.path.join(self.c.DIR_ADDON, 'ingress.yaml'))
+        self.applied = []
+        self.install()
+        assert self.applied == []  # removed addons are left in the cluster by default
+
+        self.install(prune=True)
+        assert self.applied == [('delete --ignore-not-found', ['dashboard.yaml', 'ingress.yaml'])]
+        with open(os.path.join(self.c.dir_tmp, 'ingress.yaml')) as f:
+            assert 'kind: Deployment' in f.read()  # deleted from the content last applied
+        self.applied = []
+        self.install(prune=True)
+        assert self.applied == []
+
+
+class TestDiff(RepoCommandClient):
+
+    def setUp(self):
+        super().setUp(commands.Diff)
+        with open(self.c.template_rendered_path, 'w') as f:
+            f.write('---\n\nkind: Cluster\nmetadata:\n  name: c\nspec:\n  a: 1\n  b: 2\n')
+        self.c.stdout = StringIO()
+        self.fingerprint = []
+        self.fingerprint_mock, _ = self.start_patchers(
+            patch.object(commands, 'get_cluster_state_fingerprint', side_effect=lambda *a, **kw: self.fingerprint),
+            patch.object(commands, 'get_kops_version', return_value='1.8.1'),
+        )
+
+    def test_cached_state(self):
+        kops_calls = []
+
+        def kops_cmd(args):
+            kops_calls.append(args)
+            return 'kind: Cluster\nmetadata:\n  name: c\nspec:\n  a: 1\n  b: 2\n'
+
+        self.c._kops_cmd = kops_cmd
+        self.fingerprint = [('s-acc1.k8s.local/config', '"etag1"', '2018-01-01T00:00:00')]
+        # miss, then hit
+        self.c.run(semantic=True)
+        self.c.run(semantic=True)
+        assert len(kops_calls) == 1
+        assert self.c.changes == {}
+        # kept in memory as well
+        CacheModule(self.c.DIR_CACHE).flush()
+        self.c.run(semantic=True)
+        assert len(kops_calls) == 1
+
+        # forced refresh does not even list the state store
+        listings = self.fingerprint_mock.call_count
+        self.c.run(semantic=True, refresh_state=True)
+        assert len(kops_calls) == 2
+        assert self.fingerprint_mock.call_count == listings
+
+        # cluster config changed in the state store
+        self.fingerprint = [('s-acc1.k8s.local/config', '"etag2"', '2018-01-02T00:00:00')]
+        self.c.run(semantic=True)
+        assert len(kops_calls) == 3
+        self.c.run(semantic=True)
+        assert len(kops_calls) == 3
+
+        # nothing cached without a cluster in the state store
+        self.fingerprint = []
+        self.c.run(semantic=True)
+        self.c.run(semantic=True)
+        assert len(kops_calls) == 5
+
+    def test_semantic(self):
+        self.c._kops_cmd = lambda args: 'kind: Cluster\nmetadata:\n  name: c\n  uid: x\nspec:\n  b: 2\n  a: 1\n'
+        self.c.run(semantic=True)
+        assert self.c.changes == {}
+        assert '0 resource(s) changed' in self.c.stdout.getvalue()
+
+        self.c._kops_cmd = lambda args: 'kind: Cluster\nmetadata:\n  name: c\nspec:\n  a: 3\n  b: 2\n'
+        self.c.run(semantic=True, ignore_fields='spec.b')
+        assert list(self.c.changes) == ['Cluster/c']
+        assert '==> Cluster/c' in self.c.stdout.getvalue()
+
+    def test_semantic_kops_failure(self):
+
+        def kops_cmd(args):
+            raise RuntimeError('AccessDenied: Access Denied\n\tstatus code: 403')
+
+        self.c._kops_cmd = kops_cmd
+        with pytest.raises(RuntimeError) as e:
+            self.c.run(semantic=True)
+        assert 'AccessDenied' in str(e.value)
+
+    def test_no_cluster(self):
+
+        def kops_cmd(args):
+            raise RuntimeError('No cluster found')
+
+        self.c._kops_cmd = kops_cmd
+        self.c.run(semantic=True)
+        assert list(self.c.changes) == ['Cluster/c']
+
+
+class TestWatch(RepoCommandClient):
+
+    def setUp(self):
+        super().setUp(commands.Watch, BUILD_COMMAND=commands.Build, DIFF_COMMAND=commands.Diff)
+        self.c.vpc_facts = dict(azs=['ap-southeast-2a'], vpc=dict(id='vpc-xxxx'))
+        self.c.stdout = StringIO()
+        self.runs = []
+
+        def fake_run(cmd):
+
+            def run(**kwargs):
+                self.runs.append((cmd.get_name(), kwargs))
+                cmd.stdout.write('%s done\n' % cmd.get_name())
+
+            return run
+
+        for cmd in (self.c.build_cmd, self.c.diff_cmd):
+            cmd._run = fake_run(cmd)
+
+    def test_watched_paths(self):
+        assert os.path.join(self.root, 'vars', 'acc1', 's.yaml') in self.c.watched_paths
+        assert os.path.join(self.root, 'templates', 'cluster.yaml') in self.c.watched_paths
+
+    def test_refresh(self):
+        self.c.refresh(semantic=True)
+
+        assert self.runs == [('build', {}), ('diff', dict(semantic=True))]
+        assert self.c.build_cmd.vpc_facts is self.c.vpc_facts
+        for cmd in (self.c.build_cmd, self.c.diff_cmd):
+            assert set(cmd.PRE_STEPS) - set(cmd.skipped_pre_steps) == {'ensure_workspace'}
+        assert self.c.stdout.getvalue() == 'build done\ndiff done\n'
+
+    def test_run(self):
+        changes = [{self.c.cluster_name: ['vars/acc1/s.yaml']}, {self.c.cluster_name: ['templates/cluster.yaml']}]
+        with patch.object(commands, 'watch_paths', return_value=iter(changes)) as watch_paths:
+            self.c.run(interval=0.1, iterations=2)
+
+        assert watch_paths.call_args[1]['interval'] == 0.1
+        assert [name for name, _ in self.runs] == ['build', 'diff'] * 3
+
+    def test_run_keeps_watching_on_failure(self):
+
+        def fail(**kwargs):
+            raise RuntimeError('bad template')
+
+        self.c.build_cmd._run = fail
+        with patch.object(commands, 'watch_paths', return_value=iter([{self.c.cluster_name: ['x']}])):
+            self.c.run(iterations=1)
+        with pytest.raises(RuntimeError):
+            self.c.run(iterations=0)
+
+
+class TestApply(RepoCommandClient):
+
+    def setUp(self):
+        super().setUp(commands.Apply)
+        self.c.WAIT_BACKOFF = dict(initial=0, factor=1, maximum=0)
+        with open(self.c.template_rendered_path, 'w') as f:
+            f.write(
+                'kind: Cluster\nmetadata:\n  name: s-acc1.k8s.local\nspec:\n  kubernetesVersion: 1.8.8\n'
+                '  subnets:\n  - name: ap-southeast-2a\n'
+            )
+            for name, role, min_size in (
+                ('master-a', 'Master', 1),
+                ('master-b', 'Master', 1),
+                ('nodes', 'Node', 2),
+                ('gpu', 'Node', 1),
+            ):
+                f.write(
+                    '---\nkind: InstanceGroup\nmetadata:\n  name: %s\nspec:\n  role: %s\n  minSize: %s\n'
+                    '  subnets: [ap-southeast-2a]\n' % (name, role, min_size)
+                )
+        self.c.stdout = StringIO()
+        self.kops_calls = []
+        self.ready = dict(nodes=0, gpu=1)
+        self.validations = 0
+
+        def kops_cmd(args, **kwargs):
+            self.kops_calls.append(args)
+            if args == 'validate cluster':
+                self.validations += 1
+                if self.validations < 3:
+                    raise RuntimeError('Validation Failed\nnode not ready')
+
+        def kubectl_cmd(args, **kwargs):
+            ig = args.split('kops.k8s.io/instancegroup=')[1].split(' ')[0]
+            self.ready['nodes'] += 1 if ig == 'nodes' else 0
+            node = dict(status=dict(conditions=[dict(type='Ready', status='True')]))
+            return json.dumps(dict(items=[node] * self.ready.get(ig, 1)))
+
+        self.c._kops_cmd = kops_cmd
+        self.c._kubectl_cmd = kubectl_cmd
+        self.start_patchers(
+            patch.object(commands, 'ensure_ssh_pair'),
+            patch.object(commands, 'get_kops_version', return_value='1.8.1'),
+            patch('shutil.which', return_value='/bin/kubectl'),
+        )
+
+    def test_run(self):
+        self.c.run()
+        assert [c.split(' ')[0] for c in self.kops_calls] == ['replace', 'update']
+
+    def test_unknown_subnet_rejected(self):
+        with open(self.c.template_rendered_path) as f:
+            spec = f.read().replace('  - name: ap-southeast-2a', '  - {name: ap-southeast-2a, id: subnet-gone}')
+        with open(self.c.template_rendered_path, 'w') as f:
+            f.write(spec)
+        facts = dict(azs=['ap-southeast-2a'], vpc=dict(id='vpc-xxxx', public_subnets=['subnet-1'], private_subnets=[]))
+        self.c.skipped_pre_steps = ('ensure_bin_deps', 'ensure_kops_k8s_version_consistency', 'ensure_state_store')
+        with patch.object(pre_steps, 'get_vpc_facts', return_value=facts):
+            with pytest.raises(ValueError) as e:
+                self.c._run()
+        assert 'subnet `subnet-gone` is not in vpc `vpc-xxxx`' in str(e.value)
+        assert self.kops_calls == []  # nothing written to the state store
+
+    def test_wait(self):
+        self.c.run(wait=True)
+        assert self.validations == 3
+        assert self.ready['nodes'] == 2
+        assert 'converged in' in self.c.stdout.getvalue()
+
+    def test_wait_timeout(self):
+        self.validations = -1000
+        with pytest.raises(RuntimeError) as e, self.assertLogs(self.c.logger.logger, 'INFO') as logs:
+            self.c.run(wait=True, timeout=0)
+        assert 'validate' in str(e.value) and 'ig/nodes' in str(e.value) and 'ig/gpu' not in str(e.value)
+        assert any(line.endswith('validate: not valid yet, node not ready after 0.0s') for line in logs.output)
+
+    def test_rolling_update(self):
+        self.c.run(rolling_update=True, max_in_flight=2)
+        rolled = [c.split('=')[1].split(' ')[0] for c in self.kops_calls if c.startswith('rolling-update')]
+        assert rolled[:2] == ['master-a', 'master-b']  # masters first, one at a time
+        assert sorted(rolled[2:]) == ['gpu', 'nodes']
+
+
+class TestStatus(RepoCommandClient):
+
+    def setUp(self):
+        super().setUp(commands.Status, DIFF_COMMAND=commands.Diff)
+        self.c.stdout = StringIO()
+        self.sh_calls = []
+        self.valid = True
+
+        def sh(args, timeout=None, **kwargs):
+            self.sh_calls.append((args[1], timeout))
+            if args[1] == 'validate cluster':
+                if self.valid is None:
+                    raise shell.ShellTimeout('timed out after 5s')
+                if self.valid is False:
+                    raise shell.ShellError('Validation Failed')
+                return ''
+            node = dict(status=dict(conditions=[dict(type='Ready', status='True')]))
+            return json.dumps(dict(items=[node, node, dict()]))
+
+        self.c._sh = sh
+        self.start_patchers(patch('shutil.which', side_effect=lambda bin: '/usr/bin/' + bin))
+
+    def test_run(self):
+        with patch.object(self.c.diff_cmd, 'run') as diff:
+            self.c.run(timeout=5)
+            diff.assert_not_called()
+        assert self.c.health == dict(validation='ok', nodes='2/3 ready', drift='not built')
+        assert self.c.stdout.getvalue() == 'validation -> ok, nodes -> 2/3 ready, drift -> not built\n'
+        # pinned to the cluster, with the timeout
+        assert sorted(self.sh_calls) == [('--context=s-acc1.k8s.local', 5), ('validate cluster', 5)]
+
+    def test_drift_and_failures(self):
+        open(self.c.template_rendered_path, 'w').close()
+
+        def diff(semantic=False):
+            assert semantic is True
+            self.c.diff_cmd.changes = {'Cluster/c': []}
+
+        self.valid = False
+        with patch.object(self.c.diff_cmd, 'run', side_effect=diff):
+            self.c.run()
+        assert self.c.health == dict(validation='failed', nodes='2/3 ready', drift='1 change(s)')
+
+        def slow_diff(semantic=False):
+            assert self.c.diff_cmd.cancel.wait(5)
+            raise RuntimeError('cancelled')
+
+        self.valid = None
+        with patch.object(self.c.diff_cmd, 'run', side_effect=slow_diff):
+            self.c.run(timeout=0.01)
+        assert self.c.health['validation'] == 'timeout' and self.c.health['drift'] == 'timeout'
+
+
+class TestUp(RepoCommandClient):
+
+    def setUp(self):
+        super().setUp(
+            commands.Up, BUILD_COMMAND=commands.Build, DIFF_COMMAND=commands.Diff, APPLY_COMMAND=commands.Apply
+        )
+        self.c.vpc_facts = dict(azs=['ap-southeast-2a'], vpc=dict(id='vpc-xxxx'))
+        self.c.ensure_workspace()
+        self.c.stdout = StringIO()
+
+        self.live = (
+            'apiVersion: kops/v1alpha2\nkind: Cluster\nmetadata:\n  name: c\nspec:\n  a: 1\n'
+            '  kubernetesVersion: 1.8.8\n  subnets:\n  - name: ap-southeast-2a\n'
+        )
+        self.kops_calls = []
+
+        self.rendered = self.live
+
+        def kops_cmd(args, **kwargs):
+            self.kops_calls.append(args.split(' ')[0])
+            if args.startswith('toolbox'):
+                return iter(self.rendered.splitlines())
+            if args.startswith('get'):
+                return self.live
+
+        for cmd in (self.c.build_cmd, self.c.diff_cmd, self.c.apply_cmd):
+            cmd._kops_cmd = kops_cmd
+        self.start_patchers(
+            patch.object(commands, 'get_cluster_state_fingerprint', return_value=[]),
+            patch.object(commands, 'get_kops_version', return_value='1.8.1'),
+            patch.object(commands, 'ensure_ssh_pair'),
+        )
+
+    def test_up_to_date(self):
+        self.c.run()
+        assert self.kops_calls == ['toolbox', 'get']
+        assert self.c.changes == {}
+        # the spec is handed over in memory
+        assert self.c.diff_cmd.rendered_spec == self.c.build_cmd.rendered_spec
+        assert self.c.build_cmd.dir_tmp == self.c.dir_tmp
+
+    def test_apply(self):
+        self.live = self.live.replace('a: 1', 'a: 2')
+        self.c.run()
+        assert self.kops_calls == ['toolbox', 'get', 'replace', 'update']
+        assert list(self.c.changes) == ['Cluster/c']
+        commands.ensure_ssh_pair.assert_called_once_with(self.c.apply_cmd)
+
+    def test_approval(self):
+        self.live = self.live.replace('a: 1', 'a: 2')
+        self.c.stdin = StringIO('n\n')
+        self.c.run(approve=True)
+        assert self.kops_calls == ['toolbox', 'get']
+        assert 'apply 1 change(s) to `s-acc1.k8s.local`? [y/N]' in self.c.stdout.getvalue()
+
+        self.c.stdin = StringIO('yes\n')
+        self.c.run(approve=True, force=True)
+        assert self.kops_calls[-2:] == ['replace', 'update']
@@ -0,0 +1,44 @@
+import threading
+from itertools import islice
+from unittest import TestCase
+
+from kforce.convergence import backoff, count_ready_nodes, poll
+from mock import patch
+
+
+class TestConvergence(TestCase):
+
+    def test_backoff(self):
+        assert list(islice(backoff(initial=1, factor=2, maximum=5), 5)) == [1, 2, 4, 5, 5]
+
+    @patch('time.sleep')
+    def test_poll(self, sleep):
+        states = iter([(False, '0/2'), (False, '1/2'), (True, '2/2')])
+        polls = list(poll(lambda: next(states), timeout=60, delays=[1, 2, 4]))
+        assert [(done, progress) for _, done, progress in polls] == [(False, '0/2'), (False, '1/2'), (True, '2/2')]
+        assert [c[0][0] for c in sleep.call_args_list] == [1, 2]
+
+    @patch('time.sleep')
+    def test_poll_timeout(self, sleep):
+        polls = list(poll(lambda: (False, 'never'), timeout=0))
+        assert len(polls) == 1 and polls[0][1] is False
+        sleep.assert_not_called()
+
+    def test_poll_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        polls = list(poll(lambda: (False, 'never'), timeout=60, cancel=cancel))
+        assert len(polls) == 1
+
+    def test_count_ready_nodes(self):
+
+        def node(status):
+            return dict(
+                status=dict(
+                    conditions=[dict(type='MemoryPressure', status='False'),
+                                dict(type='Ready', status=status)]
+                )
+            )
+
+        assert count_ready_nodes(dict(items=[node('True'), node('False'), node('Unknown'), node('True')])) == 2
+        assert count_ready_nodes(dict(items=[])) == 0
@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import TestCase
+from unittest.mock import create_autospec
+
+import pytest
+import yaml
+from kforce import fleet
+from kforce.commands import Diff, Status, Watch
+from kforce.fleet import Fleet
+from mock import patch
+
+
+def fake_func(self):
+    ...
+
+
+class TestFleet(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.tmp_dir, 'clusters.yaml')
+        with open(self.manifest, 'w') as f:
+            yaml.safe_dump(
+                dict(
+                    defaults=dict(region='ap-southeast-2'),
+                    clusters=[
+                        dict(env='s', account_name='acc1', vpc_id='vpc-1'),
+                        dict(env='u', account_name='acc1', vpc_id='vpc-2'),
+                        dict(env='s', account_name='acc2', vpc_id='vpc-3'),
+                    ]
+                ), f
+            )
+        self.fleet = Fleet(manifest=self.manifest, workers=2)
+        self.fleet.stdout = StringIO()
+
+        self.pre_steps = {
+            name: create_autospec(fake_func)
+            for name in dir(Watch)
+            if name.startswith('ensure') and callable(getattr(Watch, name))
+        }
+        self.patchers = [
+            patch.object(klass, name, f)
+            for klass in (Diff, Status, Watch)
+            for name, f in self.pre_steps.items()
+            if hasattr(klass, name)
+        ]
+        for p in self.patchers:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_shared_pre_steps(self):
+
+        def run(self):
+            self.stdout.write('diff of %s' % self.cluster_name)
+
+        with patch.object(Diff, 'run', run):
+            self.fleet.diff()
+
+        assert self.pre_steps['ensure_kops_k8s_version_consistency'].call_count == 1
+        assert self.pre_steps['ensure_state_store'].call_count == 2  # once per account
+        assert self.pre_steps['ensure_region'].call_count == 3
+        assert [r.ok for r in self.fleet.results] == [True, True, True]
+
+        output = self.fleet.stdout.getvalue()
+        for name in ('s-acc1.k8s.local', 'u-acc1.k8s.local', 's-acc2.k8s.local'):
+            assert '==> {} (diff)\ndiff of {}'.format(name, name) in output
+
+    def test_facts_snapshot(self):
+        snapshots = []
+
+        def run(self):
+            snapshots.append(self.facts_snapshot)
+
+        with patch.object(Diff, 'run', run):
+            self.fleet.diff()
+        assert snapshots == [True, True, True]
+
+    def test_failure_isolated(self):
+
+        def run(self):
+            if self.cluster_name == 'u-acc1.k8s.local':
+                raise RuntimeError('boom')
+
+        with patch.object(Diff, 'run', run):
+            with pytest.raises(RuntimeError) as e:
+                self.fleet.diff()
+
+        assert 'u-acc1.k8s.local' in str(e.value)
+        assert [r.ok for r in self.fleet.results] == [True, False, True]
+        assert 'failed' in self.fleet.stdout.getvalue()
+
+    def test_shared_pre_step_failure(self):
+        self.pre_steps['ensure_state_store'].side_effect = [None, RuntimeError('no bucket')]
+
+        with patch.object(Diff, 'run', fake_func):
+            with pytest.raises(RuntimeError):
+                self.fleet.diff()
+
+        assert [r.ok for r in self.fleet.results] == [True, True, False]
+
+    def test_logs_prefixed_with_cluster(self):
+
+        def run(self):
+            self.logger.info('running')
+
+        with patch.object(Diff, 'run', run):
+            with self.assertLogs('kforce.commands') as logs:
+                self.fleet.diff()
+
+        for name in ('s-acc1.k8s.local', 'u-acc1.k8s.local', 's-acc2.k8s.local'):
+            assert 'INFO:kforce.commands:[{}] running'.format(name) in logs.output
+
+    def test_watch(self):
+        refreshed = []
+
+        def refresh(self, semantic=True):
+            refreshed.append(self.cluster_name)
+            self.stdout.write('diff of %s' % self.cluster_name)
+
+        changes = iter([{'u-acc1.k8s.local': ['vars/acc1/u.yaml']}])
+        with patch.object(Watch, 'refresh', refresh), patch.object(fleet, 'watch_paths', return_value=changes):
+            self.fleet.watch(iterations=1)
+
+        assert sorted(refreshed[:3]) == ['s-acc1.k8s.local', 's-acc2.k8s.local', 'u-acc1.k8s.local']
+        assert refreshed[3:] == ['u-acc1.k8s.local']
+        assert self.pre_steps['ensure_aws_facts'].call_count == 3  # not again on a change
+        assert [r.cluster for r in self.fleet.results] == ['u-acc1.k8s.local']
+        assert self.fleet.stdout.getvalue().count('==> u-acc1.k8s.local (watch)\ndiff of u-acc1.k8s.local') == 2
+
+    def test_status(self):
+
+        def run(self, timeout=60):
+            assert timeout == 5
+            validation = 'failed' if self.env == 'u' else 'ok'
+            self.health = dict(validation=validation, nodes='3/3 ready', drift='none')
+
+        with patch.object(Status, 'run', run):
+            with pytest.raises(RuntimeError) as e:
+                self.fleet.status(timeout=5)
+        assert 'u-acc1.k8s.local' in str(e.value) and 's-acc1.k8s.local' not in str(e.value)
+
+        lines = self.fleet.stdout.getvalue().splitlines()
+        assert lines[0].split() == ['CLUSTER', 'VALIDATION', 'NODES', 'DRIFT', 'DURATION', 'ERROR']
+        assert lines[2].split()[:5] == ['u-acc1.k8s.local', 'failed', '3/3', 'ready', 'none']
+        assert '3 cluster(s), 1 unhealthy' in lines[-1]
+        assert '==>' not in self.fleet.stdout.getvalue()
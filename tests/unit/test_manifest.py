@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from kforce.manifest import changed_inputs, dump_manifest, hash_data, hash_paths, load_manifest
+
+
+class TestManifest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'd', 'sub'))
+        for f in ('a.yaml', 'd/b.yaml', 'd/sub/c.yaml'):
+            with open(os.path.join(self.root, f), 'w') as fp:
+                fp.write(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_hash_paths(self):
+        paths = [os.path.join(self.root, p) for p in ('a.yaml', 'd', 'not-there')]
+        hashes = hash_paths(paths, root=self.root)
+        assert sorted(hashes) == ['a.yaml', 'd/b.yaml', 'd/sub/c.yaml']
+        assert hashes == hash_paths(paths, root=self.root)
+
+    def test_changed_inputs(self):
+        old = dict(a='1', b='2', c='3')
+        new = dict(a='1', b='x', d='4')
+        assert changed_inputs(old, new) == ['b', 'c', 'd']
+        assert changed_inputs(old, dict(old)) == []
+        assert hash_data(dict(a=1, b=2)) == hash_data(dict(b=2, a=1))
+
+    def test_load_dump(self):
+        path = os.path.join(self.root, 'manifest.json')
+        assert load_manifest(path) == {}
+        dump_manifest(path, dict(inputs=dict(a='1'), output='x'))
+        assert load_manifest(path) == dict(inputs=dict(a='1'), output='x')
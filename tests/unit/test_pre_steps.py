@@ -0,0 +1,278 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import boto3
+import pytest
+from botocore.client import BaseClient
+from kforce import aws_clients, pre_steps
+from kforce.commands import Apply, Build, Command, Diff
+from mock import patch
+from moto import mock_ec2, mock_s3
+
+
+class TestEnsureAwsFacts(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.c = Build(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        self.c.DIR_CACHE = self.cache_dir
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    @patch.object(pre_steps, 'get_vpc_facts', return_value=dict(azs=[], vpc=dict(id='vpc-xxxx')))
+    def test_cached(self, get_vpc_facts):
+        self.c.ensure_aws_facts()
+        self.c.ensure_aws_facts()
+        get_vpc_facts.assert_called_once_with(vpc_id='vpc-xxxx', region='ap-southeast-2')
+        assert self.c.vpc_facts == dict(azs=[], vpc=dict(id='vpc-xxxx'))
+
+    @patch.object(pre_steps, 'get_vpc_facts', return_value=dict(azs=[], vpc=dict(id='vpc-xxxx')))
+    def test_refresh_facts(self, get_vpc_facts):
+        self.c.ensure_aws_facts()
+        self.c.refresh_facts = True
+        self.c.ensure_aws_facts()
+        assert get_vpc_facts.call_count == 2
+
+    @patch.object(pre_steps, 'snapshot_region')
+    @patch.object(pre_steps, 'get_vpc_facts')
+    def test_snapshot(self, get_vpc_facts, snapshot_region):
+        snapshot_region.side_effect = [
+            dict(region='ap-southeast-2', vpcs={'vpc-yyyy': {}}),
+            dict(region='ap-southeast-2', vpcs={
+                'vpc-xxxx': {},
+                'vpc-yyyy': {}
+            }),
+        ]
+        other = Build(env='p', account_name='acc1', vpc_id='vpc-yyyy', facts_snapshot=True)
+        other.DIR_CACHE = self.cache_dir
+        self.c.facts_snapshot = True
+        facts = dict(azs=[], vpc=dict(id='vpc-xxxx'))
+        with patch.dict(pre_steps._region_snapshots, clear=True), \
+                patch.object(pre_steps, 'get_vpc_facts_from_snapshot', return_value=facts) as from_snapshot:
+            self.c.ensure_aws_facts()  # vpc created after the first sweep, swept again
+            self.c.ensure_aws_facts()
+            other.ensure_aws_facts()
+            assert snapshot_region.call_count == 2
+            pre_steps._region_snapshots.clear()  # new process, snapshot from the disk cache
+            other.ensure_aws_facts()
+            assert snapshot_region.call_count == 2
+
+        assert get_vpc_facts.call_count == 0
+        assert self.c.vpc_facts == facts
+        assert from_snapshot.call_args[0][1] == 'vpc-yyyy'
+
+
+class TestEnsureWorkspace(TestCase):
+
+    def test_isolated_and_cleaned_up(self):
+        c1 = Command(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        c2 = Command(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        for c in (c1, c2):
+            for name in dir(c):
+                if name.startswith('ensure') and name != 'ensure_workspace':
+                    setattr(c, name, lambda: None)
+
+        workspaces = []
+
+        def run():
+            workspaces.append(c1.dir_tmp)
+            assert os.path.isdir(c1.dir_tmp)
+            c2.ensure_workspace()
+            assert c2.dir_tmp != c1.dir_tmp
+
+        c1.run = run
+        c1._run()
+
+        assert c1.dir_tmp is None
+        assert not os.path.exists(workspaces[0])
+        assert os.path.isdir(c2.dir_tmp)
+        shutil.rmtree(c2.dir_tmp)
+
+
+class TestGetKopsVersion(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.kops_path = os.path.join(self.root, 'kops')
+        with open(self.kops_path, 'w') as f:
+            f.write('#!/bin/sh\n')
+        self.c = Build(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        self.c.DIR_CACHE = os.path.join(self.root, '.kforce_cache')
+        self.kops_calls = []
+
+        def kops_cmd(args):
+            self.kops_calls.append(args)
+            return 'Version 1.8.1 (git-xxxx)'
+
+        self.c._kops_cmd = kops_cmd
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_cached_until_binary_changes(self):
+        with patch('shutil.which', return_value=self.kops_path):
+            with patch.dict(pre_steps._kops_versions, clear=True):
+                assert pre_steps.get_kops_version(self.c) == '1.8.1'
+                assert pre_steps.get_kops_version(self.c) == '1.8.1'
+            assert len(self.kops_calls) == 1
+
+            # a new process reads the version from disk
+            with patch.dict(pre_steps._kops_versions, clear=True):
+                assert pre_steps.get_kops_version(self.c) == '1.8.1'
+            assert len(self.kops_calls) == 1
+
+            # kops upgraded
+            with open(self.kops_path, 'a') as f:
+                f.write('# v1.9\n')
+            with patch.dict(pre_steps._kops_versions, clear=True):
+                pre_steps.get_kops_version(self.c)
+            assert len(self.kops_calls) == 2
+
+
+def count_api_calls():
+    """`(calls, patcher)`, `calls` lists the name of every boto3 api call made while `patcher` is active"""
+    make_api_call = BaseClient._make_api_call
+    calls = []
+
+    def counting_make_api_call(client, operation_name, api_params):
+        calls.append(operation_name)
+        return make_api_call(client, operation_name, api_params)
+
+    return calls, patch.object(BaseClient, '_make_api_call', autospec=True, side_effect=counting_make_api_call)
+
+
+@mock_s3
+class TestEnsureStateStore(TestCase):
+
+    def setUp(self):
+        os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        aws_clients.reset()
+        self.cache_dir = tempfile.mkdtemp()
+        self.c = Diff(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        self.c.DIR_CACHE = self.cache_dir
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_create_then_exists(self):
+        calls, counting = count_api_calls()
+        with counting:
+            self.c.ensure_state_store()
+            assert calls == ['HeadBucket', 'CreateBucket', 'PutBucketVersioning']
+
+            # verified recently, no call at all
+            self.c.ensure_state_store()
+            assert len(calls) == 3
+
+            # record expired, a cheap HEAD only
+            with patch.object(pre_steps, 'VERIFIED_TTL', 0.01):
+                time.sleep(0.02)
+                self.c.ensure_state_store()
+            assert calls[3:] == ['HeadBucket']
+
+        s3 = boto3.client('s3', region_name='ap-southeast-2')
+        assert s3.get_bucket_versioning(Bucket='acc1-k8s-state-store')['Status'] == 'Enabled'
+
+    def test_forgotten_on_failure(self):
+        self.c.ensure_state_store()
+        for name in self.c.PRE_STEPS:
+            if name != 'ensure_state_store':
+                setattr(self.c, name, lambda: None)
+
+        calls, counting = count_api_calls()
+        with counting:
+            self.c.run = lambda: None
+            self.c._run()
+            assert calls == []  # verified already
+
+            def run():
+                raise RuntimeError('kops failed')
+
+            self.c.run = run
+            with pytest.raises(RuntimeError):
+                self.c._run()
+            assert calls == []
+            self.c.ensure_state_store()
+        assert calls == ['HeadBucket']
+
+    def test_kops_not_installed(self):
+        with patch('shutil.which', return_value=None):
+            with pytest.raises(RuntimeError) as e:
+                pre_steps.get_kops_version(self.c)
+        assert '`kops` is NOT installed!' in str(e.value)
+
+
+@mock_ec2
+class TestEnsureSshPair(TestCase):
+
+    def setUp(self):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        aws_clients.reset()
+        self.root = tempfile.mkdtemp()
+        self.c = Apply(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        self.c.DIR_CACHE = os.path.join(self.root, '.kforce_cache')
+        self.c.dir_tmp = self.root
+        self.c.current_value_file_path = os.path.join(self.root, 's.yaml')
+        self.public_keys = [
+            rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key().public_bytes(
+                serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH
+            ).decode() for _ in range(2)
+        ]
+        self.set_public_key(self.public_keys[0])
+
+        self.kops_calls = []
+        self.secrets = []
+
+        def kops_cmd(args):
+            self.kops_calls.append(args.split(' ')[0])
+            if args.startswith('create'):
+                self.secrets.append('admin')
+            elif 'admin' not in self.secrets:
+                raise RuntimeError('secret not found')
+            return 'SSHPublicKey  admin  xxxx'
+
+        self.c._kops_cmd = kops_cmd
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def set_public_key(self, key):
+        with open(self.c.current_value_file_path, 'w') as f:
+            f.write('publicKey: %s\n' % key)
+
+    def test_check_first(self):
+        calls, counting = count_api_calls()
+        with counting:
+            pre_steps.ensure_ssh_pair(self.c)
+            assert calls == ['DescribeKeyPairs', 'ImportKeyPair']
+            assert self.kops_calls == ['get', 'create']
+
+            # verified recently, neither an api call nor a subprocess
+            pre_steps.ensure_ssh_pair(self.c)
+            assert len(calls) == 2
+            assert len(self.kops_calls) == 2
+
+            # vars changed, checked again, nothing written
+            self.set_public_key(self.public_keys[1])
+            pre_steps.ensure_ssh_pair(self.c)
+            assert calls[2:] == ['DescribeKeyPairs']
+            assert self.kops_calls[2:] == ['get']
+
+    def test_not_recorded_on_failure(self):
+
+        def kops_cmd(args):
+            raise RuntimeError('kops: state store unreachable')
+
+        self.c._kops_cmd = kops_cmd
+        with pytest.raises(RuntimeError):
+            pre_steps.ensure_ssh_pair(self.c)
+        assert not os.path.exists(self.c.DIR_CACHE)
@@ -0,0 +1,100 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import yaml
+from jinja2 import Template
+from kforce import renderer
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE = '''\
+kubernetesVersion: 1.8.8
+env: {{ env }}
+account: {{ account_name }}
+configBase: s3://{{ state_store_name }}/{{ env }}-{{ account_name }}.k8s.local
+{% for az in ['a', 'b', 'c'] %}
+zone-{{ az }}: {{ env }}-{{ az }}
+{% endfor %}
+{{ vpc_facts }}
+'''
+
+
+def make_facts(index):
+    vpc = dict(id='vpc-%s' % index, cidr='10.%s.0.0/16' % index, public_subnets=[], private_subnets=[])
+    for i, az in enumerate('abc'):
+        for facing in ('public', 'private'):
+            subnet_id = 'subnet-%s%s%s' % (index, facing, az)
+            vpc['%s_subnets' % facing].append(subnet_id)
+            vpc['subnet-%s-ap-southeast-2%s' % (facing, az)] = [subnet_id]
+            vpc.setdefault(az, {})[facing] = dict(id=subnet_id, cidr='10.%s.%s.0/24' % (index, i))
+    return dict(azs=['ap-southeast-2' + az for az in 'abc'], vpc=vpc)
+
+
+class TestRenderer(TestCase):
+
+    def setUp(self):
+        renderer.reset()
+        self.template_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.template_dir, '.cache')
+        with open(os.path.join(self.template_dir, renderer.VALUES_TEMPLATE), 'w') as f:
+            f.write(TEMPLATE)
+
+    def tearDown(self):
+        renderer.reset()
+        shutil.rmtree(self.template_dir)
+
+    def render(self, index):
+        return renderer.render_values(
+            self.template_dir,
+            self.cache_dir,
+            vpc_facts=make_facts(index),
+            env='s',
+            account_name='acc%s' % index,
+            state_store_name='acc%s-k8s-state-store' % index,
+        )
+
+    def render_uncached(self, index):
+        # what every build used to do
+        with open(os.path.join(self.template_dir, renderer.VALUES_TEMPLATE)) as f:
+            template = Template(f.read())
+        return template.render(
+            env='s',
+            account_name='acc%s' % index,
+            state_store_name='acc%s-k8s-state-store' % index,
+            vpc_facts=yaml.dump(make_facts(index), default_flow_style=False)
+        )
+
+    def test_render_values(self):
+        assert self.render(1) == self.render_uncached(1)
+
+    def test_template_compiled_once(self):
+        env = renderer.get_environment(self.template_dir, self.cache_dir)
+        assert renderer.get_environment(self.template_dir, self.cache_dir) is env
+        assert env.get_template(renderer.VALUES_TEMPLATE) is env.get_template(renderer.VALUES_TEMPLATE)
+        # bytecode persisted for the next process
+        assert len(os.listdir(self.cache_dir)) == 1
+
+        # an edited template is picked up
+        with open(os.path.join(self.template_dir, renderer.VALUES_TEMPLATE), 'w') as f:
+            f.write('edited {{ env }}')
+        os.utime(os.path.join(self.template_dir, renderer.VALUES_TEMPLATE), (time.time() + 5, ) * 2)
+        assert self.render(1) == 'edited s'
+
+    def test_benchmark_100_clusters(self):
+
+        def best_of(render, runs=3):
+            timings = []
+            for _ in range(runs):
+                start = time.time()
+                for index in range(100):
+                    render(index)
+                timings.append(time.time() - start)
+            return min(timings)
+
+        cached, uncached = best_of(self.render), best_of(self.render_uncached)
+        logger.info('rendering values of 100 clusters -> cached: %.3fs, uncached: %.3fs', cached, uncached)
+        assert cached < uncached
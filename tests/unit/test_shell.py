@@ -0,0 +1,52 @@
+import sys
+import threading
+import time
+from unittest import TestCase
+
+import pytest
+from kforce import shell
+
+
+def py(code):
+    return [sys.executable, '-c', code]
+
+
+class TestShell(TestCase):
+
+    def test_run(self):
+        out = shell.run(py('import sys; print("a"); print("oops", file=sys.stderr); print("b")'))
+        assert out == 'a\nb'
+        assert shell.run(py('print("a")'), capture=False) is None
+
+    def test_no_shell(self):
+        assert shell.run(['echo', '$HOME', '|', 'cat']) == '$HOME | cat'
+
+    def test_stream(self):
+        lines = list(shell.stream(py('import sys; print("a"); sys.stdout.flush(); print("e", file=sys.stderr)')))
+        assert sorted(lines) == [(shell.STDERR, 'e'), (shell.STDOUT, 'a')]
+
+    def test_error(self):
+        with pytest.raises(shell.ShellError) as e:
+            shell.run(py('import sys; print("No cluster found", file=sys.stderr); sys.exit(3)'))
+        assert isinstance(e.value, RuntimeError)
+        assert e.value.exitcode == 3
+        assert 'No cluster found' in e.value.args[0]
+
+    def test_timeout(self):
+        start = time.time()
+        with pytest.raises(shell.ShellTimeout):
+            shell.run(py('import time; print("started", flush=True); time.sleep(10)'), timeout=0.5)
+        assert time.time() - start < 5
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        threading.Timer(0.3, cancel.set).start()
+        with pytest.raises(shell.ShellCancelled):
+            shell.run(py('import time; time.sleep(10)'), cancel=cancel)
+
+    def test_close_kills_process(self):
+        lines = shell.stream(py('import time\nwhile True: print("x", flush=True); time.sleep(0.01)'))
+        assert next(lines) == (shell.STDOUT, 'x')
+        start = time.time()
+        lines.close()
+        assert time.time() - start < 5
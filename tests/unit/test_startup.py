@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase, skipIf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# deferred until the command needing them runs
+HEAVY_MODULES = (
+    'boto3',
+    'botocore',
+    'jinja2',
+    'yaml',
+    'difflib',
+)
+
+# cumulative import time budget of `kforce.commands` in microseconds, ~50ms locally, importing boto3 alone blows it
+IMPORT_TIME_BUDGET = 150000
+
+
+def python(*args):
+    return subprocess.run(
+        [sys.executable] + list(args), cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+
+
+class TestStartup(TestCase):
+
+    def test_no_heavy_imports(self):
+        out = python('-c', 'import sys, kforce.commands; print(" ".join(sorted(sys.modules)))').stdout.decode()
+        modules = out.split()
+        assert [m for m in HEAVY_MODULES if m in modules] == []
+
+    @skipIf(sys.version_info < (3, 7), '`-X importtime` is new in python 3.7')
+    def test_import_time_budget(self):
+        # best of a few runs to keep the check stable on a busy machine
+        timings = []
+        for _ in range(3):
+            err = python('-X', 'importtime', '-c', 'import kforce.commands').stderr.decode()
+            for line in err.splitlines():
+                if not line.startswith('import time:'):
+                    continue
+                _, cumulative, name = line.split('|')
+                if name.strip() == 'kforce.commands':
+                    timings.append(int(cumulative))
+        assert timings, err
+        assert min(timings) < IMPORT_TIME_BUDGET, timings
+
+    def test_only_requested_command_created(self):
+        from kforce import commands
+
+        factory = commands.CommandFactory(env='s', account_name='acc1', vpc_id='vpc-xxxx')
+        assert factory.build.__self__ is factory.build.__self__
+        assert list(factory._cmds) == [commands.Build]
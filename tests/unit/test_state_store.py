@@ -0,0 +1,40 @@
+import os
+from unittest import TestCase
+
+import boto3
+from kforce import aws_clients
+from kforce.state_store import get_cluster_state_fingerprint
+from moto import mock_s3
+
+REGION = 'ap-southeast-2'
+BUCKET = 'acc1-k8s-state-store'
+CLUSTER = 's-acc1.k8s.local'
+
+
+@mock_s3
+class TestStateStore(TestCase):
+
+    def setUp(self):
+        os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        aws_clients.reset()
+        self.s3 = boto3.client('s3', region_name=REGION)
+        self.s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration=dict(LocationConstraint=REGION))
+
+    def test_fingerprint(self):
+        assert get_cluster_state_fingerprint(BUCKET, CLUSTER, region=REGION) == []
+
+        for key in ('config', 'instancegroup/nodes', 'instancegroup/master-a', 'pki/private/ca/x.key'):
+            self.s3.put_object(Bucket=BUCKET, Key='%s/%s' % (CLUSTER, key), Body=key.encode())
+        self.s3.put_object(Bucket=BUCKET, Key='u-acc1.k8s.local/config', Body=b'other cluster')
+
+        fingerprint = get_cluster_state_fingerprint(BUCKET, CLUSTER, region=REGION)
+        assert [f[0] for f in fingerprint] == [
+            CLUSTER + '/config',
+            CLUSTER + '/instancegroup/master-a',
+            CLUSTER + '/instancegroup/nodes',
+        ]
+        assert get_cluster_state_fingerprint(BUCKET, CLUSTER, region=REGION) == fingerprint
+
+        self.s3.put_object(Bucket=BUCKET, Key=CLUSTER + '/instancegroup/nodes', Body=b'maxSize: 5')
+        assert get_cluster_state_fingerprint(BUCKET, CLUSTER, region=REGION) != fingerprint
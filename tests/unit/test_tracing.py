@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pytest
+from kforce import aws_clients, commands, tracing
+from mock import patch
+from moto import mock_s3
+
+
+class TestTracing(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        tracing.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_report_path(self):
+        with patch.dict(os.environ, clear=True):
+            assert tracing.report_path() is None
+            assert tracing.report_path(True) == tracing.DEFAULT_REPORT_PATH
+            assert tracing.report_path('/tmp/p.json') == '/tmp/p.json'
+        with patch.dict(os.environ, {tracing.ENV_PROFILE: '1'}):
+            assert tracing.report_path() == tracing.DEFAULT_REPORT_PATH
+        with patch.dict(os.environ, {tracing.ENV_PROFILE: '/tmp/env.json'}):
+            assert tracing.report_path() == '/tmp/env.json'
+
+    def test_disabled(self):
+        with tracing.span('x', 'sh'):
+            ...
+        assert tracing.start() is True
+        assert tracing.stop() == []
+
+    def test_spans(self):
+        assert tracing.start() is True
+        assert tracing.start() is False  # already recording, owned by the first caller
+
+        with tracing.span('build', 'command', cluster='s-acc1.k8s.local'):
+            tracing.traced(lambda: None, 'ensure_region', 'pre_step')()
+        with pytest.raises(ValueError):
+            with tracing.span('kops get', 'sh'):
+                raise ValueError('boom')
+
+        spans = tracing.stop()
+        expected = [('ensure_region', 'pre_step'), ('build', 'command'), ('kops get', 'sh')]
+        assert [(s.name, s.category) for s in spans] == expected
+        assert spans[-1].args == dict(error="ValueError('boom')")
+
+        report = tracing.build_report(spans)
+        assert report['totals']['pre_step']['count'] == 1
+        assert list(report['clusters']) == ['s-acc1.k8s.local']
+        assert [s['name'] for s in report['spans']] == ['build', 'ensure_region', 'kops get']
+
+        trace = tracing.build_chrome_trace(spans)
+        assert [e['ph'] for e in trace['traceEvents']] == ['X', 'X', 'X', 'M']
+
+    @mock_s3
+    def test_aws_calls(self):
+        os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        aws_clients.reset()
+        s3 = aws_clients.get_client('s3', region='us-east-1')
+        s3.list_buckets()  # not recording
+
+        tracing.start()
+        s3.list_buckets()
+        with pytest.raises(Exception):
+            s3.head_bucket(Bucket='missing')
+        spans = tracing.stop()
+
+        expected = [('ListBuckets', 'aws', 's3'), ('HeadBucket', 'aws', 's3')]
+        assert [(s.name, s.category, s.args['service']) for s in spans] == expected
+
+    def test_command_report(self):
+        report_path = os.path.join(self.tmp_dir, 'profile.json')
+        trace_path = os.path.join(self.tmp_dir, 'trace.json')
+        c = commands.Command(
+            env='s', account_name='acc1', vpc_id='vpc-xxxx', profile=report_path, profile_trace=trace_path
+        )
+        for name in c.PRE_STEPS:
+            setattr(c, name, lambda: None)
+        c.run = lambda: c._sh(['true', '--flag', 'sub'])
+        c._run()
+
+        assert tracing.is_enabled() is False
+        with open(report_path) as f:
+            report = json.load(f)
+        assert sorted(s['name'] for s in report['spans'] if s['category'] == 'pre_step') == sorted(c.PRE_STEPS)
+        assert [s['name'] for s in report['spans'] if s['category'] == 'sh'] == ['true sub']
+        assert list(report['clusters']) == ['s-acc1.k8s.local']
+        with open(trace_path) as f:
+            assert len(json.load(f)['traceEvents']) > len(c.PRE_STEPS)
@@ -0,0 +1,75 @@
+import threading
+import time
+from unittest import TestCase
+
+import pytest
+from kforce.utils import format_table, run_graph
+
+
+class TestRunGraph(TestCase):
+
+    def test_order_and_concurrency(self):
+        done = []
+        lock = threading.Lock()
+        running = []
+
+        def task(name):
+
+            def f():
+                with lock:
+                    running.append(name)
+                time.sleep(0.05)
+                with lock:
+                    done.append(name)
+                return name
+
+            return f
+
+        results = run_graph(
+            tasks={n: task(n)
+                   for n in ('a', 'b', 'c', 'd')},
+            dependencies=dict(c=('a', 'b'), d=('c', )),
+            max_workers=4,
+        )
+        assert list(results) == ['a', 'b', 'c', 'd']
+        assert all(r.ok and r.result == n for n, r in results.items())
+        assert set(done[:2]) == {'a', 'b'}
+        assert done[2:] == ['c', 'd']
+
+    def test_failure_skips_dependents_only(self):
+
+        def boom():
+            raise RuntimeError('boom')
+
+        results = run_graph(
+            tasks=dict(a=boom, b=lambda: 'b', c=lambda: 'c', d=lambda: 'd'),
+            dependencies=dict(d=('c', ), c=('a', )),
+        )
+        assert results['a'].ok is False and isinstance(results['a'].error, RuntimeError)
+        assert results['b'].ok is True
+        assert results['c'].skipped is True and results['d'].skipped is True
+
+    def test_durations(self):
+
+        def slow():
+            time.sleep(0.1)
+
+        def slow_failure():
+            time.sleep(0.1)
+            raise RuntimeError('boom')
+
+        results = run_graph(tasks=dict(a=slow, b=slow_failure), dependencies={})
+        assert results['a'].ok is True and results['a'].duration >= 0.1
+        assert results['b'].ok is False and results['b'].duration >= 0.1
+
+    def test_invalid_graph(self):
+        with pytest.raises(ValueError):
+            run_graph(tasks=dict(a=lambda: 1), dependencies=dict(a=('x', )))
+        with pytest.raises(ValueError):
+            run_graph(tasks=dict(a=lambda: 1, b=lambda: 1), dependencies=dict(a=('b', ), b=('a', )))
+
+
+class TestFormatTable(TestCase):
+
+    def test_format_table(self):
+        assert format_table(('A', 'LONG'), [(1, 2), ('xxx', '')]) == 'A    LONG\n1    2\nxxx'
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pytest
+from kforce import validator
+from kforce.validator import ValidationError, check_spec, check_values, compile_path, validate_spec, validate_values
+
+PUBLIC_KEY = 'ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABAQC7 user@host'
+VPC_FACTS = dict(
+    azs=['ap-southeast-2a'],
+    vpc={
+        'id': 'vpc-1',
+        'public_subnets': ['subnet-pub'],
+        'private_subnets': ['subnet-priv'],
+        'a': dict(public=dict(id='subnet-pub'), private=dict(id='subnet-priv', nat_id='nat-1')),
+    },
+)
+
+
+def make_spec(igs=('nodes', ), subnet_id='subnet-priv', egress='nat-1', version='1.8.8'):
+    spec = '''
+apiVersion: kops/v1alpha2
+kind: Cluster
+metadata:
+  name: s-acc1.k8s.local
+spec:
+  kubernetesVersion: %s
+  networkID: vpc-1
+  subnets:
+  - {id: %s, name: ap-southeast-2a, type: Private, egress: %s, zone: ap-southeast-2a}
+''' % (version, subnet_id, egress)
+    for ig in igs:
+        spec += '---\nkind: InstanceGroup\nmetadata:\n  name: %s\nspec:\n  role: Node\n' % ig
+        spec += '  subnets: [ap-southeast-2a]\n'
+    return spec
+
+
+class TestValidator(TestCase):
+
+    def test_compile_path(self):
+        doc = dict(spec=dict(subnets=[dict(id='a'), dict(name='b'), dict(id='c')]))
+        assert compile_path('spec.subnets[].id')(doc) == ['a', 'c']
+        assert compile_path('spec.missing')(doc) == []
+        assert compile_path('spec.subnets[].id') is compile_path('spec.subnets[].id')  # compiled once
+
+    def test_check_values(self):
+        assert check_values(dict(publicKey=PUBLIC_KEY, kubernetesVersion='1.8.8'), kops_version='1.8.1') == []
+        assert check_values(dict(kubernetesVersion='1.8.8')) == ['`publicKey` is a required var']
+        assert check_values(dict(publicKey='not a key')) == ['`publicKey` is not an ssh public key']
+        problems = check_values(dict(publicKey=PUBLIC_KEY, kubernetesVersion='1.9.3'), kops_version='1.8.1')
+        assert problems == ['`kubernetesVersion`: kubernetes 1.9.3 needs kops 1.9.x, got kops 1.8.1']
+
+    def test_validate_values(self):
+        root = tempfile.mkdtemp()
+        try:
+            paths = [os.path.join(root, 'values.yaml'), os.path.join(root, 's.yaml')]
+            contents = ('kubernetesVersion: 1.8.8\npublicKey: ""\n', 'publicKey: %s\n' % PUBLIC_KEY)
+            for path, content in zip(paths, contents):
+                with open(path, 'w') as f:
+                    f.write(content)
+            validate_values(paths, kops_version='1.8.1')  # later file wins
+            with pytest.raises(ValidationError) as e:
+                validate_values(paths[:1])
+            assert e.value.problems == ['`publicKey` is a required var']
+        finally:
+            shutil.rmtree(root)
+
+    def test_validate_spec(self):
+        validate_spec(make_spec(), vpc_facts=VPC_FACTS, kops_version='1.8.1')
+        validate_spec(make_spec(subnet_id='subnet-gone'))  # subnets only checked against facts
+
+    def test_check_spec_problems(self):
+        with pytest.raises(ValidationError) as e:
+            validate_spec(
+                make_spec(igs=('nodes', 'nodes', 'gpu'), subnet_id='subnet-gone', egress='nat-2', version='1.9.0'),
+                source='s-acc1.yaml',
+                vpc_facts=VPC_FACTS,
+                kops_version='1.8.1',
+            )
+        assert e.value.source == 's-acc1.yaml'
+        assert e.value.problems == [
+            'InstanceGroup/nodes: defined 2 times',
+            'Cluster: kubernetes 1.9.0 needs kops 1.9.x, got kops 1.8.1',
+            'Cluster: subnet `subnet-gone` is not in vpc `vpc-1`',
+            'Cluster: egress `nat-2` is not a nat gateway of vpc `vpc-1`',
+        ]
+
+    def test_check_spec_structure(self):
+        ig_spec = dict(role='Node', subnets=['x'], minSize=3, maxSize=1)
+        docs = [dict(kind='InstanceGroup', metadata=dict(name='nodes'), spec=ig_spec)]
+        assert check_spec(docs) == ['exactly one `Cluster` expected, got 0']
+        docs.append(dict(kind='Cluster', metadata=dict(name='c'), spec=dict(subnets=[dict(name='a')])))
+        assert check_spec(docs) == [
+            'Cluster/c: `spec.kubernetesVersion` is required',
+            'InstanceGroup/nodes: subnet `x` is not a subnet of the cluster',
+            'InstanceGroup/nodes: minSize 3 > maxSize 1',
+        ]
+
+    def test_not_yaml(self):
+        with pytest.raises(ValidationError):
+            validate_spec('a: [', source='broken.yaml')
+        assert validator.SSH_PUBLIC_KEY_RE.match(PUBLIC_KEY)
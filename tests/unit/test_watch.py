@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from kforce import watch
+from mock import patch
+
+
+class TestWatch(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'templates', 'snippets'))
+        os.makedirs(os.path.join(self.root, 'vars', 'acc1'))
+        self.paths = dict(
+            cluster_s=(os.path.join(self.root, 'templates'), os.path.join(self.root, 'vars', 'acc1', 's.yaml')),
+            cluster_p=(os.path.join(self.root, 'templates'), os.path.join(self.root, 'vars', 'acc1', 'p.yaml')),
+        )
+        for f in ('templates/cluster.yaml', 'templates/snippets/gpu.yaml', 'vars/acc1/s.yaml', 'vars/acc1/p.yaml'):
+            self.write(f, 'a: 1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, f, content):
+        with open(os.path.join(self.root, f), 'w') as fp:
+            fp.write(content)
+
+    def test_snapshot(self):
+        files = watch.snapshot(self.paths['cluster_s'] + (os.path.join(self.root, 'missing'), ))
+        expected = ['templates/cluster.yaml', 'templates/snippets/gpu.yaml', 'vars/acc1/s.yaml']
+        assert sorted(os.path.relpath(f, self.root) for f in files) == expected
+
+    def test_watch_paths(self):
+        edits = iter(
+            [
+                lambda: None,  # nothing changed
+                lambda: self.write('vars/acc1/s.yaml', 'a: 22\n'),
+                lambda: self.write('templates/snippets/new.yaml', 'b: 1\n'),
+                lambda: os.remove(os.path.join(self.root, 'vars', 'acc1', 'p.yaml')),
+            ]
+        )
+        with patch.object(watch.time, 'sleep', side_effect=lambda interval: next(edits)()):
+            changes = list(watch.watch_paths(self.paths, interval=0.1, iterations=4))
+
+        new_snippet = os.path.join(self.root, 'templates', 'snippets', 'new.yaml')
+        assert changes == [
+            dict(cluster_s=[os.path.join(self.root, 'vars', 'acc1', 's.yaml')]),
+            dict(cluster_s=[new_snippet], cluster_p=[new_snippet]),
+            dict(cluster_p=[os.path.join(self.root, 'vars', 'acc1', 'p.yaml')]),
+        ]
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        assert list(watch.watch_paths(self.paths, interval=10, cancel=cancel)) == []
@@ -0,0 +1,86 @@
+from unittest import TestCase
+
+import pytest
+
+from kforce.yaml_diff import diff_documents, load_documents, normalize
+
+CURRENT = """
+apiVersion: kops/v1alpha2
+kind: Cluster
+metadata:
+  creationTimestamp: 2018-01-01T00:00:00Z
+  name: s-acc1.k8s.local
+spec:
+  kubernetesVersion: 1.8.8
+  channel: stable
+---
+apiVersion: kops/v1alpha2
+kind: InstanceGroup
+metadata:
+  creationTimestamp: 2018-01-01T00:00:00Z
+  name: nodes
+spec:
+  maxSize: 3
+---
+apiVersion: kops/v1alpha2
+kind: InstanceGroup
+metadata:
+  name: spot
+spec:
+  maxSize: 1
+"""
+
+DESIRED = """
+---
+
+apiVersion: kops/v1alpha2
+kind: Cluster
+metadata:
+  name: s-acc1.k8s.local
+spec:
+  channel: stable
+  kubernetesVersion: 1.8.8
+---
+apiVersion: kops/v1alpha2
+kind: InstanceGroup
+metadata:
+  name: nodes
+spec:
+  maxSize: 5
+---
+apiVersion: kops/v1alpha2
+kind: InstanceGroup
+metadata:
+  name: bastions
+spec:
+  maxSize: 1
+"""
+
+
+class TestYamlDiff(TestCase):
+
+    def test_load_documents(self):
+        docs = load_documents(DESIRED)
+        assert list(docs) == ['Cluster/s-acc1.k8s.local', 'InstanceGroup/nodes', 'InstanceGroup/bastions']
+
+    def test_normalize(self):
+        doc = dict(metadata=dict(name='x', uid='1'), status=dict(a=1), spec=None)
+        assert normalize(doc, ('metadata.uid', 'status', 'spec.x.y')) == dict(metadata=dict(name='x'), spec=None)
+        assert doc['metadata']['uid'] == '1'
+
+    def test_diff_documents(self):
+        changes = dict(diff_documents(load_documents(CURRENT), load_documents(DESIRED)))
+
+        # reordered keys and server populated fields are not changes
+        assert sorted(changes) == ['InstanceGroup/bastions', 'InstanceGroup/nodes', 'InstanceGroup/spot']
+        assert '-  maxSize: 3' in changes['InstanceGroup/nodes']
+        assert '+  maxSize: 5' in changes['InstanceGroup/nodes']
+        assert all(not line.startswith('-') or line.startswith('---') for line in changes['InstanceGroup/bastions'])
+        assert all(not line.startswith('+') or line.startswith('+++') for line in changes['InstanceGroup/spot'])
+
+        assert list(diff_documents(load_documents(DESIRED), load_documents(DESIRED))) == []
+
+    def test_invalid_yaml(self):
+        with pytest.raises(ValueError) as e:
+            load_documents('error: a: b\n  - x', source='current_state')
+        assert '`current_state` is not valid yaml' in str(e.value)